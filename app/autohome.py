@@ -1,12 +1,42 @@
+import os
 import re
-import time
 import csv
-import json
+import sys
+import time
+import signal
 import logging
 from pathlib import Path
 from datetime import datetime
 from logging import handlers
+from collections import Counter, deque
+from urllib.parse import urljoin, urlsplit
 from playwright.sync_api import sync_playwright
+from page_window import PageWindow, MAX_REQUEUE
+from discovery import PRICE_DISCOVERY
+from browser_pool import BrowserPool
+from work_queue import WorkQueue
+from routing import RoutingPolicy
+from metrics import METRICS
+from rate_limit import AdaptiveRateLimiter, RetryQueue, domain_of, page_blocked
+from checkpoint import CheckpointStore
+from page_archive import PageArchive, ARCHIVE_ENABLED
+from csv_store import read_header, read_last_row, count_rows, BufferedCsvWriter
+from autohome_parser import parse_review_page, UNKNOWN_REVIEWER
+from readiness import wait_ready, wait_for_growth, wait_replaced, log_wait_summary
+
+# 评价按批写入 CSV 的行数与最长间隔（秒）
+CSV_BATCH_SIZE = int(os.environ.get('AUTOHOME_CSV_BATCH', 50))
+CSV_FLUSH_SECONDS = float(os.environ.get('AUTOHOME_CSV_FLUSH_SECONDS', 30))
+# 每个口碑列表页同时打开的评价详情页数量，以及同一域名下的并发上限
+REVIEW_CONCURRENCY = int(os.environ.get('AUTOHOME_REVIEW_CONCURRENCY', 4))
+DOMAIN_CONCURRENCY = int(os.environ.get('AUTOHOME_DOMAIN_CONCURRENCY', 4))
+# 增量模式：重新访问已完成的车型，遇到整页都已抓取过的口碑列表就停止翻页
+INCREMENTAL = os.environ.get('AUTOHOME_INCREMENTAL', '0') == '1'
+# 运行模式：standalone 自己发现并抓取；coordinator 只滚动价格页并把车型放入任务队列；worker 只从队列领取车型抓取
+MODE = os.environ.get('AUTOHOME_MODE', 'standalone')
+WORK_QUEUE = 'autohome_cars'
+
+REVIEW_ID_PATTERN = re.compile(r'view_([0-9a-zA-Z]+)')
 
 def create_directory(path):
     directory = Path(path)
@@ -19,28 +49,35 @@ def create_directory(path):
 def sanitize_filename(filename):
     return re.sub(r'[\\/*?:"<>|]', '_', filename)
 
-def load_progress():
-    progress_file = Path('./autohome_reviews/autohome_progressed.json')
-    if progress_file.exists():
-        with open(progress_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-def save_progress(car_name, status, last_user_id=None, review_progress=None):
-    progress_file = Path('./autohome_reviews/autohome_progressed.json')
-    if progress_file.exists():
-        with open(progress_file, 'r', encoding='utf-8') as f:
-            progress = json.load(f)
-    else:
-        progress = {}
-
-    progress[car_name] = {
-        'status': status,
-        'last_user_id': last_user_id,
-        'review_progress': review_progress
-    }
-    with open(progress_file, 'w', encoding='utf-8') as f:
-        json.dump(progress, f, ensure_ascii=False, indent=4)
+def review_key(url):
+    """评价的稳定标识：详情页地址中的评价ID，取不到时使用去掉参数的地址"""
+    match = REVIEW_ID_PATTERN.search(url)
+    if match:
+        return match.group(1)
+    parts = urlsplit(url)
+    return f'{parts.netloc}{parts.path}'
+
+def convert_progress_json(progress):
+    """将旧版 autohome_progressed.json 的内容转换为断点库记录
+
+    旧版按 page_N_item_M 记录评价，列表顺序变化后就失效了，因此不再导入。
+    """
+    for car_name, car_progress in progress.items():
+        yield 'autohome_cars', car_name, {'status': car_progress.get('status'),
+                                          'last_user_id': car_progress.get('last_user_id')}
+
+def load_progress(store):
+    if store.migrate_json(Path('./autohome_reviews/autohome_progressed.json'), convert_progress_json):
+        logger.info("已将 autohome_progressed.json 导入断点库")
+    return store.items('autohome_cars')
+
+def save_progress(store, car_name, status, last_user_id=None, review_ids=(), resume=None):
+    entries = [('autohome_cars', car_name, {'status': status, 'last_user_id': last_user_id})]
+    for review_id in review_ids:
+        entries.append(('autohome_seen', review_id, {'car': car_name}))
+    if resume:
+        entries.append(('autohome_resume', car_name, resume))
+    store.write(entries)
 
 def get_existing_car_files(directory):
     existing_files = set()
@@ -49,22 +86,49 @@ def get_existing_car_files(directory):
         existing_files.add(car_name)
     return existing_files
 
-def get_last_reviewed_user_id(file_path):
-    last_user_id = None
-    if file_path.exists():
-        with open(file_path, 'r', newline='', encoding='utf-8') as csv_file:
-            reader = csv.DictReader(csv_file)
-            rows = list(reader)
-            if rows:
-                last_user_id = rows[-1]['用户ID']
-    return last_user_id
-
-def write_to_csv(file_path, data, mode='a', fieldnames=None):
-    with open(file_path, mode, newline='', encoding='utf-8') as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        if mode == 'w':
-            writer.writeheader()
-        writer.writerow(data)
+def load_legacy_users(store, car_name, file_path):
+    """去重索引建立之前写入的评价没有评价ID，只能按用户ID去重
+
+    只有表头没有评价ID列，或者恢复索引与文件不符（可能由旧版本写入）时才扫描文件，
+    每个车型只扫描一次，结果记入断点库；未知用户不参与去重。
+    车型完整抓取过一遍之后，旧评价都已按评价ID记入索引，此后返回空集合。
+    """
+    if not file_path.exists() or store.get('autohome_legacy_checked', car_name):
+        return set()
+    legacy_users = store.get('autohome_legacy_users', car_name)
+    if legacy_users is not None:
+        return set(legacy_users)
+    resume = store.get('autohome_resume', car_name)
+    if '评价ID' in read_header(file_path) and resume and resume.get('size') == file_path.stat().st_size:
+        return set()
+
+    with open(file_path, 'r', newline='', encoding='utf-8') as csv_file:
+        legacy_users = {row.get('用户ID') for row in csv.DictReader(csv_file) if not row.get('评价ID')}
+    legacy_users -= {None, '', UNKNOWN_REVIEWER}
+    store.put('autohome_legacy_users', car_name, sorted(legacy_users))
+    return legacy_users
+
+def load_resume_index(store, car_name, file_path):
+    """读取车型评价文件的恢复索引 {'last_user_id', 'rows', 'size'}
+
+    索引随每条评价一起写入断点库；记录的文件大小与实际不符（旧版本数据或写入中途被中断）时，
+    从文件末尾读取最后一条记录并重建索引。
+    """
+    if not file_path.exists():
+        return {'last_user_id': None, 'rows': 0, 'size': 0}
+    size = file_path.stat().st_size
+    resume = store.get('autohome_resume', car_name)
+    if resume and resume.get('size') == size:
+        return resume
+
+    last_row = read_last_row(file_path)
+    resume = {
+        'last_user_id': last_row.get('用户ID') if last_row else None,
+        'rows': count_rows(file_path),
+        'size': size,
+    }
+    store.put('autohome_resume', car_name, resume)
+    return resume
 
 def setup_logging():
     global logger
@@ -91,14 +155,197 @@ def setup_logging():
     logger.addHandler(console_handler)
     logger.addHandler(file_handler)
 
+def extract_review(content):
+    """用 lxml 解析评价页 HTML，返回 {'车名', '用户ID', 标题: 内容, 标题评分: 评分}，找不到车名时返回 None"""
+    with METRICS.timer('parse'):
+        review_data = parse_review_page(content)
+    if review_data is None:
+        logger.warning("未能找到车名")
+        return None
+    logger.info(f"Fetching reviews for car: {review_data['车名']}")
+    if review_data['用户ID'] == UNKNOWN_REVIEWER:
+        logger.warning("未能找到评价人的ID")
+    return review_data
+
+def link_url(page, element):
+    """返回链接元素的绝对地址，没有可用的 href 时返回 None"""
+    href = element.get_attribute('href')
+    if not href or href.startswith('javascript'):
+        return None
+    return urljoin(page.url, href)
+
+def click_opener(context, element):
+    """没有 href 的链接只能点击打开，返回一个在窗口中打开新标签页的函数"""
+    def open_page():
+        with context.expect_page() as page_info:
+            element.click()
+        return page_info.value
+    return open_page
+
+def scrape_koubei(pool, limiter, koubei_page, car_name_out, car_progress, store, csv_file_path, archive=None):
+    """逐页抓取口碑列表，每页的评价详情从浏览器池借页面并发打开，同时预取下一页列表；返回最后写入的用户ID
+
+    打开失败的评价按退避时间重试，翻页结束后再等待重试一轮剩余的评价。
+    """
+    # 先于恢复索引读取：恢复索引重建之后就无法判断它之前是否与文件相符
+    legacy_users = load_legacy_users(store, car_name_out, csv_file_path)
+    resume = load_resume_index(store, car_name_out, csv_file_path)
+    last_user_id = resume['last_user_id']
+    if last_user_id is None:
+        last_user_id = car_progress.get('last_user_id')
+
+    # 本次已写入但可能还在缓存中、尚未记入索引的评价
+    written_ids = set()
+    logger.info(f"Last reviewed user ID for {car_name_out} is {last_user_id} ({resume['rows']} reviews saved)")
+
+    # 评价批量写入，落盘后再提交这一批的进度
+    def commit_reviews(rows, review_ids):
+        resume.update(last_user_id=rows[-1]['用户ID'], rows=resume['rows'] + len(rows),
+                      size=csv_file_path.stat().st_size)
+        save_progress(store, car_name_out, 'incomplete', resume['last_user_id'], review_ids, dict(resume))
+
+    def handle_review(review_id, review_page):
+        # 点击打开的评价在打开之后才知道地址
+        if review_id is None:
+            review_id = review_key(review_page.url)
+            if review_id in written_ids or store.existing('autohome_seen', [review_id]):
+                logger.info(f"Review {review_id} has already been processed. Skipping...")
+                return
+        wait_ready(review_page, 'autohome', 'review')
+        # 只取一次页面 HTML，解析和存档共用
+        with METRICS.timer('dom_extract'):
+            content = review_page.content()
+        review_data = extract_review(content)
+        if review_data is None:
+            return
+        reviewer_id = review_data['用户ID']
+        if reviewer_id in legacy_users:
+            logger.info(f"Review by user {reviewer_id} has already been processed. Skipping...")
+            store.put('autohome_seen', review_id, {'car': car_name_out})
+            return
+        written_ids.add(review_id)
+        # 只存档写入 CSV 的评价，重新解析时按评价ID替换对应的行
+        if archive:
+            archive.save('autohome_review', review_id, review_page.url, content, car=car_name_out)
+        writer.write({'评价ID': review_id, **review_data}, review_id)
+        METRICS.inc('pages_total', kind='review')
+        logger.info(f"Review saved for car {car_name_out} by user {reviewer_id}")
+
+    # 评价ID -> 详情页地址，失败时按地址重试
+    review_urls = {}
+    retries = RetryQueue()
+
+    def on_error(review_id, e):
+        logger.error(f"An error occurred while processing review {review_id} for car {car_name_out}: {str(e)}")
+        METRICS.failure(e, stage='review')
+        if review_id in review_urls and retries.add(review_id, review_urls[review_id]):
+            logger.info(f"Review {review_id} will be retried (attempt {retries.attempts[review_id]}).")
+
+    writer = BufferedCsvWriter(csv_file_path, CSV_BATCH_SIZE, CSV_FLUSH_SECONDS, on_flush=commit_reviews)
+    window = PageWindow(pool, REVIEW_CONCURRENCY, DOMAIN_CONCURRENCY, limiter=limiter)
+    prefetched_page = None
+    try:
+        current_page = 1
+        while True:
+            review_buttons = koubei_page.query_selector_all('//a[contains(text(),"查看完整口碑")]')
+            logger.info(f"Found {len(review_buttons)} reviews on page {current_page} for {car_name_out}.")
+
+            # 有地址的评价在打开之前就按评价ID查重
+            review_targets = []
+            for review_button in review_buttons:
+                url = link_url(koubei_page, review_button)
+                review_targets.append((review_key(url), url) if url
+                                      else (None, click_opener(koubei_page.context, review_button)))
+            seen = store.existing('autohome_seen', [review_id for review_id, _ in review_targets if review_id])
+            seen.update(review_id for review_id, _ in review_targets if review_id in written_ids)
+            review_queue = deque(target for target in review_targets if target[0] not in seen)
+            review_urls.update(target for target in review_queue if target[0])
+            logger.info(f"{len(review_queue)} new reviews on page {current_page}, {len(seen)} already processed.")
+
+            # 增量模式下列表按时间倒序，整页都已抓取过说明后面不会再有新评价
+            if INCREMENTAL and review_buttons and not review_queue:
+                logger.info(f"No new reviews on page {current_page} for car {car_name_out}. Stopping.")
+                koubei_page.close()
+                break
+
+            # 处理本页评价之前先开始加载下一页列表
+            next_page_button = koubei_page.query_selector("//a[contains(@class, 'ace-pagination__btn next')]")
+            has_next = next_page_button is not None and 'disabled' not in (next_page_button.get_attribute('class') or '')
+            next_url = link_url(koubei_page, next_page_button) if has_next else None
+            if next_url:
+                next_domain = domain_of(next_url)
+                limiter.acquire(next_domain, sleep=pool.wait)
+                prefetched_page = koubei_page.context.new_page()
+                start = time.perf_counter()
+                try:
+                    with METRICS.timer('navigate'):
+                        prefetched_page.goto(next_url, wait_until='commit')
+                except Exception:
+                    limiter.record(next_domain, time.perf_counter() - start, ok=False,
+                                   blocked=page_blocked(prefetched_page))
+                    raise
+                # 处理本页评价的时间不计入下一页的耗时
+                prefetch_elapsed = time.perf_counter() - start
+
+            # 已到重试时间的失败评价随本页一起处理
+            review_queue.extend(retries.pop_due())
+            window.process(review_queue, handle_review, on_error)
+            METRICS.inc('pages_total', kind='koubei')
+            METRICS.maybe_export()
+
+            if prefetched_page:
+                logger.info(f"Moving to prefetched page {current_page + 1} for car {car_name_out}.")
+                koubei_page.close()
+                koubei_page, prefetched_page = prefetched_page, None
+                start = time.perf_counter()
+                try:
+                    wait_ready(koubei_page, 'autohome', 'koubei')
+                except Exception:
+                    limiter.record(next_domain, prefetch_elapsed + time.perf_counter() - start, ok=False,
+                                   blocked=page_blocked(koubei_page))
+                    raise
+                limiter.record(next_domain, prefetch_elapsed + time.perf_counter() - start)
+                current_page += 1
+            elif has_next:
+                logger.info(f"Clicking next page {current_page + 1} for car {car_name_out}.")
+                first_review_button = review_buttons[0] if review_buttons else None
+                next_page_button.click()
+                if first_review_button:
+                    wait_replaced(koubei_page, 'autohome', 'koubei', first_review_button)
+                else:
+                    wait_ready(koubei_page, 'autohome', 'koubei')
+                current_page += 1
+            else:
+                if next_page_button:
+                    logger.info(f"No more pages for car {car_name_out}. Closing the review page.")
+                else:
+                    logger.warning(f"Next page button not found for car {car_name_out}. Closing the review page.")
+                koubei_page.close()
+                break
+
+        for batch in retries.drain(sleep=pool.wait):
+            logger.info(f"Retrying {len(batch)} failed reviews for car {car_name_out}.")
+            window.process(deque(batch), handle_review, on_error)
+    finally:
+        writer.close()
+        # 预取页和翻页后的列表页不属于浏览器池，出错时也要关闭，否则会一直留在主上下文中
+        for page in (prefetched_page, koubei_page):
+            if page:
+                pool.close_page(page)
+
+    return resume['last_user_id']
+
 def run(playwright):
     setup_logging()
 
     base_output_dir = 'autohome_reviews'
     create_directory(base_output_dir)
+    # metrics.json / metrics.prom 在运行中定期覆盖写出
+    METRICS.directory = Path(base_output_dir) / 'reports'
 
     existing_files = get_existing_car_files(base_output_dir)
-    progress = load_progress()
+    store = CheckpointStore(Path(base_output_dir) / 'checkpoints.db')
+    progress = load_progress(store)
 
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -106,186 +353,230 @@ def run(playwright):
         "Accept-Encoding": "gzip, deflate, br"
     }
 
-    browser = playwright.chromium.launch(headless=True)
-    context = browser.new_context()
-    page = context.new_page()
-
-    def handle_request(route, request):
-        if request.resource_type == "image":
-            route.abort()  # 禁止加载图片
-        else:
-            route.continue_(headers={**request.headers, **headers})
-
-    page.route("**/*", handle_request)
-
-    page.goto("https://www.autohome.com.cn/price/#pvareaid=6861598")
-
-    car_data = {}
-    previous_height = 0
-
-    while True:
-        car_cards = page.query_selector_all('//li[contains(@class,"group")]')
-        logger.info(f"Found {len(car_cards)} car cards.")
-
-        new_cards = 0
-        for car_card in car_cards:
-            car_name = car_card.query_selector('//a[contains(@class,"text")]').inner_text().strip()
-            sanitized_car_name = sanitize_filename(car_name)
-            if sanitized_car_name not in car_data and sanitized_car_name not in existing_files:
-                car_data[sanitized_car_name] = car_card
-                new_cards += 1
-
-        if new_cards > 0:
-            logger.info(f"{new_cards} new car cards found, starting to scrape...")
-
-            for car_name, car_card in car_data.items():
+    # 多容器运行时共享卷上的任务队列；coordinator 在启动浏览器之前先开始新一轮，
+    # 同时启动的 worker 不会因为上一轮留下的关闭状态直接退出
+    work_queue = WorkQueue(Path(base_output_dir) / 'work_queue.db') if MODE != 'standalone' else None
+    if MODE == 'coordinator':
+        work_queue.open(WORK_QUEUE)
+
+    # 每个上下文（包括回收和重启后新建的）都注册路由，车系页、口碑页等同样屏蔽图片等无用资源
+    routing = RoutingPolicy.from_env('autohome', headers)
+    pool = BrowserPool(playwright, logger, setup_context=routing.install, headless=True)
+    limiter = AdaptiveRateLimiter()
+    # 单机运行时失败的车型退避后重试；worker 模式由任务队列负责重试
+    car_retries = RetryQueue() if MODE == 'standalone' else None
+    METRICS.collect('browser_pool', pool.summary)
+    METRICS.collect('routing', routing.summary)
+    METRICS.collect('rate_limit', limiter.summary, label='domain')
+    # 保存原始页面，解析逻辑修改后可以用 page_archive.py 离线重新解析
+    archive = PageArchive(Path(base_output_dir) / 'archive') if ARCHIVE_ENABLED else None
+    if archive:
+        METRICS.collect('page_archive', archive.summary)
+
+    def open_price_page():
+        price_page = pool.main_context.new_page()
+        price_page.goto("https://www.autohome.com.cn/price/#pvareaid=6861598")
+        wait_ready(price_page, 'autohome', 'price')
+        return price_page
+
+    def navigate(target_page, url, kind):
+        """限速后导航并等待页面就绪，把耗时和是否被拦截反馈给限速器"""
+        domain = domain_of(url)
+        limiter.acquire(domain, sleep=pool.wait)
+        start = time.perf_counter()
+        try:
+            with METRICS.timer('navigate'):
+                target_page.goto(url)
+            wait_ready(target_page, 'autohome', kind)
+        except Exception:
+            limiter.record(domain, time.perf_counter() - start, ok=False, blocked=page_blocked(target_page))
+            raise
+        limiter.record(domain, time.perf_counter() - start)
+
+    def scrape_car(car_name_out, series_url):
+        """按车系页地址打开并抓取一个车型的全部口碑"""
+        car_progress = progress.get(car_name_out, {})
+        # 增量模式重新访问所有车型，只抓取去重索引中没有的新评价
+        if not INCREMENTAL:
+            if car_progress.get('status') == 'completed':
+                logger.info(f"Skipping {car_name_out} as it is already completed.")
+                return
+            if not car_progress and car_name_out in existing_files:
+                logger.info(f"Skipping {car_name_out} as its review file already exists.")
+                return
+
+        save_progress(store, car_name_out, 'incomplete', car_progress.get('last_user_id'))
+        new_page = pool.main_context.new_page()
+        try:
+            navigate(new_page, series_url, 'series')
+
+            new_page.mouse.click(100, 100)
+
+            koubei_button = new_page.query_selector('//li/a[text()="口碑"]')
+            if koubei_button:
+                koubei_url = link_url(new_page, koubei_button)
+                if koubei_url:
+                    # 口碑页直接在车系页的标签页中打开
+                    koubei_page = new_page
+                    navigate(koubei_page, koubei_url, 'koubei')
+                else:
+                    with pool.main_context.expect_page() as koubei_page_info:
+                        koubei_button.click()
+                    koubei_page = koubei_page_info.value
+                    wait_ready(koubei_page, 'autohome', 'koubei')
+
+                csv_file_path = Path(base_output_dir) / f'{car_name_out}_评价.csv'
+                last_user_id = scrape_koubei(pool, limiter, koubei_page, car_name_out, car_progress, store,
+                                             csv_file_path, archive)
+                save_progress(store, car_name_out, 'completed', last_user_id)
+                store.put('autohome_legacy_checked', car_name_out, True)
+            else:
+                logger.info(f"No koubei tab on the series page of {car_name_out}, nothing to scrape.")
+                save_progress(store, car_name_out, 'completed', car_progress.get('last_user_id'))
+        except Exception:
+            save_progress(store, car_name_out, 'error', car_progress.get('last_user_id'))
+            raise
+        finally:
+            pool.close_page(new_page)
+
+    def work():
+        """worker 模式：从任务队列逐个领取车型抓取，队列关闭且排空后退出"""
+        for leased in work_queue.iter_leases(WORK_QUEUE):
+            for car_name, task in leased:
+                logger.info(f"Leased car {car_name}")
                 try:
-                    car_name_out = car_name
-                    car_progress = progress.get(car_name_out, {})
-                    if car_progress.get('status') == 'completed':
-                        logger.info(f"Skipping {car_name_out} as it is already completed.")
-                        continue
-
-                    save_progress(car_name_out, 'incomplete')
-
-                    with context.expect_page() as new_page_info:
-                        car_card.click()
-
-                    new_page = new_page_info.value
-                    new_page.wait_for_load_state("networkidle")
-                    time.sleep(5)
-
-                    new_page.mouse.click(100, 100)
-                    time.sleep(1)
-
-                    koubei_button = new_page.query_selector('//li/a[text()="口碑"]')
-                    if koubei_button:
-                        with context.expect_page() as koubei_page_info:
-                            koubei_button.click()
-
-                        koubei_page = koubei_page_info.value
-                        koubei_page.wait_for_load_state("networkidle")
-                        time.sleep(2)
-
-                        csv_file_path = Path(base_output_dir) / f'{car_name_out}_评价.csv'
-                        last_user_id = get_last_reviewed_user_id(csv_file_path)
-                        if last_user_id is None:
-                            last_user_id = car_progress.get('last_user_id')
-
-                        review_progress = car_progress.get('review_progress', {})
-                        logger.info(f"Last reviewed user ID for {car_name_out} is {last_user_id}")
-
-                        current_page = 1
-                        while True:
-                            review_buttons = koubei_page.query_selector_all('//a[contains(text(),"查看完整口碑")]')
-                            logger.info(f"Found {len(review_buttons)} reviews on page {current_page} for {car_name_out}.")
-
-                            for index, review_button in enumerate(review_buttons):
-                                review_id = f"page_{current_page}_item_{index+1}"
-                                review_progress_for_id = review_progress.get(review_id, {})
-
-                                if review_progress_for_id.get('reviewed'):
-                                    logger.info(f"Review {review_id} has already been processed. Skipping...")
-                                    continue
-
-                                review_page = None
-                                try:
-                                    with context.expect_page() as review_page_info:
-                                        review_button.click()
-
-                                    review_page = review_page_info.value
-                                    review_page.wait_for_load_state("networkidle")
-                                    time.sleep(2)
-
-                                    car_name_elem = review_page.query_selector('//div[contains(@class,"title-name")]//a')
-                                    if car_name_elem:
-                                        car_name = car_name_elem.text_content().strip()
-                                        logger.info(f"Fetching reviews for car: {car_name}")
-                                    else:
-                                        logger.warning("未能找到车名")
-                                        continue
-
-                                    reviewer_id_elem = review_page.query_selector('//a[contains(@id,"nickname")]')
-                                    if reviewer_id_elem:
-                                        reviewer_id = reviewer_id_elem.text_content().strip()
-                                        if reviewer_id == last_user_id:
-                                            logger.info(f"Review by user {reviewer_id} has already been processed. Skipping...")
-                                            continue
-                                    else:
-                                        reviewer_id = "未知用户"
-                                        logger.warning("未能找到评价人的ID")
-
-                                    review_items = review_page.query_selector_all('//p[@class="kb-item-msg"]')
-                                    review_titles = review_page.query_selector_all('//p[@class="kb-item-msg"]/preceding-sibling::h1')
-                                    review_scores = review_page.query_selector_all('//p[@class="kb-item-msg"]/preceding-sibling::h1/span')
-
-                                    # 构建包含标题及评分的字典
-                                    review_data = {'车名': car_name, '用户ID': reviewer_id}
-                                    for title, item, score in zip(review_titles, review_items, review_scores):
-                                        # 仅保留标题中的中文字符
-                                        cleaned_title = ''.join(re.findall(r'[\u4e00-\u9fa5]', title.text_content().strip()))
-                                        cleaned_item = item.text_content().strip()
-                                        cleaned_score = score.text_content().strip() if score else '无评分'
-                                        
-                                        # 以清理后的标题为键名保存数据
-                                        review_data[f'{cleaned_title}'] = cleaned_item
-                                        review_data[f'{cleaned_title}评分'] = cleaned_score
-
-                                    if not csv_file_path.exists():
-                                        fieldnames = list(review_data.keys())
-                                        write_to_csv(csv_file_path, review_data, 'w', fieldnames=fieldnames)
-                                    else:
-                                        write_to_csv(csv_file_path, review_data, 'a', fieldnames=list(review_data.keys()))
-                                    logger.info(f"Review saved for car {car_name_out} by user {reviewer_id}")
-
-                                    review_progress[review_id] = {'reviewed': True}
-                                    save_progress(car_name_out, 'incomplete', reviewer_id, review_progress)
-
-                                except Exception as e:
-                                    logger.error(f"An error occurred while processing review {review_id} for car {car_name_out}: {str(e)}")
-                                finally:
-                                    if review_page:
-                                        review_page.close()
-
-                            next_page_button = koubei_page.query_selector("//a[contains(@class, 'ace-pagination__btn next')]")
-                            if next_page_button:
-                                class_list = next_page_button.get_attribute('class')
-                                if 'disabled' not in class_list:
-                                    logger.info(f"Clicking next page {current_page + 1} for car {car_name_out}.")
-                                    next_page_button.click()
-                                    koubei_page.wait_for_load_state("networkidle")
-                                    time.sleep(2)
-                                    current_page += 1
-                                else:
-                                    logger.info(f"No more pages for car {car_name_out}. Closing the review page.")
-                                    koubei_page.close()
-                                    break
-                            else:
-                                logger.warning(f"Next page button not found for car {car_name_out}. Closing the review page.")
-                                koubei_page.close()
-                                break
-
-                        save_progress(car_name_out, 'completed')
-
-                    new_page.close()
-
+                    with work_queue.keep_alive(WORK_QUEUE, [car_name]):
+                        scrape_car(car_name, task['url'])
                 except Exception as e:
-                    logger.error(f"An error occurred while processing {car_name_out}: {str(e)}")
-                    save_progress(car_name_out, 'error')
+                    logger.error(f"An error occurred while processing {car_name}: {str(e)}")
+                    METRICS.failure(e, stage='car')
+                    pool.restart_if_crashed()
+                    recorded = work_queue.fail(WORK_QUEUE, car_name, e)
+                else:
+                    recorded = work_queue.complete(WORK_QUEUE, car_name)
+                if not recorded:
+                    logger.warning(f"Lease on {car_name} expired and was taken over by another worker.")
+        logger.info(f"任务队列已排空: {work_queue.counts(WORK_QUEUE)}")
+
+    def crawl_price_list():
+        """滚动价格页发现车型；coordinator 模式只入队，其他模式直接抓取"""
+        page = open_price_page()
+        generation = pool.generation
+
+        seen_cars = set()
+        # 待抓取的 (车名, 车系页URL)，由滚动发现的车型卡片填充
+        pending = deque()
+        # 每个车型因浏览器崩溃而重试的次数
+        crash_retries = Counter()
+
+        while True:
+            if pool.generation != generation:
+                # 浏览器重启后价格页已失效，重新打开；已发现的车型按地址访问，不受影响
+                logger.warning("浏览器已重启，重新打开价格页")
+                page = open_price_page()
+                generation = pool.generation
+
+            try:
+                # 一次 evaluate 只取回本次滚动新出现的卡片
+                discovered = PRICE_DISCOVERY.discover(page)
+            except Exception:
+                if pool.restart_if_crashed():
                     continue
+                raise
 
-        page.evaluate("window.scrollBy(0, document.body.scrollHeight);")
-        time.sleep(2)
-
-        current_height = page.evaluate("document.body.scrollHeight")
-        if current_height == previous_height:
-            break
+            new_cards = 0
+            for car_name, url in discovered:
+                car_name = sanitize_filename(car_name)
+                if car_name in seen_cars:
+                    continue
+                seen_cars.add(car_name)
+                new_cards += 1
+                if url:
+                    pending.append((car_name, url))
+                else:
+                    logger.warning(f"{car_name} 没有找到车系页链接")
+            logger.info(f"Found {new_cards} new car cards.")
+
+            if pending and work_queue:
+                # 增量模式下已完成的车型也要重新入队
+                added = work_queue.enqueue(WORK_QUEUE, {car_name: {'url': url} for car_name, url in pending},
+                                           reset=INCREMENTAL)
+                pending.clear()
+                logger.info(f"{added} cars added to the work queue.")
+
+            elif pending or car_retries:
+                # 已到重试时间的失败车型随新车型一起抓取
+                pending.extend(car_retries.pop_due())
+                logger.info(f"{len(pending)} cars to scrape...")
+
+                while pending:
+                    car_name, url = pending.popleft()
+                    car_generation = pool.generation
+                    try:
+                        scrape_car(car_name, url)
+                    except Exception as e:
+                        logger.error(f"An error occurred while processing {car_name}: {str(e)}")
+                        METRICS.failure(e, stage='car')
+                        pool.restart_if_crashed()
+                        # 浏览器崩溃时立即重新排队，其他错误退避后重试，已写入的评价会按评价ID跳过
+                        if pool.generation != car_generation and crash_retries[car_name] < MAX_REQUEUE:
+                            crash_retries[car_name] += 1
+                            pending.append((car_name, url))
+                        elif car_retries.add(car_name, url):
+                            logger.info(f"{car_name} will be retried (attempt {car_retries.attempts[car_name]}).")
+
+            if pool.generation != generation:
+                continue
+
+            try:
+                previous_height = page.evaluate("document.body.scrollHeight")
+                page.evaluate("window.scrollBy(0, document.body.scrollHeight);")
+                grew = wait_for_growth(page, 'autohome', 'price', previous_height)
+            except Exception:
+                if pool.restart_if_crashed():
+                    continue
+                raise
+            if not grew:
+                break
 
-        previous_height = current_height
+    if MODE == 'worker':
+        work()
+    else:
+        crawl_price_list()
+        if work_queue:
+            work_queue.close(WORK_QUEUE)
+            logger.info(f"入队完毕: {work_queue.counts(WORK_QUEUE)}")
+
+    # 结束之前，等待并重试所有仍在重试队列中的车型
+    if car_retries:
+        for batch in car_retries.drain(sleep=pool.wait):
+            logger.info(f"Retrying {len(batch)} failed cars.")
+            for car_name, url in batch:
+                try:
+                    scrape_car(car_name, url)
+                except Exception as e:
+                    logger.error(f"An error occurred while processing {car_name}: {str(e)}")
+                    METRICS.failure(e, stage='car')
+                    pool.restart_if_crashed()
+                    if car_retries.add(car_name, url):
+                        logger.info(f"{car_name} will be retried (attempt {car_retries.attempts[car_name]}).")
 
     logger.info("Scraping completed.")
-    context.close()
-    browser.close()
+    METRICS.export()
+    for line in METRICS.summary_lines():
+        logger.info(f"指标 {line}")
+    log_wait_summary(logger)
+    routing.log_summary(logger)
+    limiter.log_summary(logger)
+    pool.log_summary()
+    if archive:
+        archive.log_summary(logger)
+        archive.close()
+    store.close()
+    pool.close()
+
+# docker stop 发送 SIGTERM，转换为正常退出以便写出缓存中的评价
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
 with sync_playwright() as playwright:
     run(playwright)
@@ -0,0 +1,43 @@
+import re
+from lxml import etree, html
+
+# 预编译的 XPath，整个评价页只解析一次 DOM
+CAR_NAME = etree.XPath('//div[contains(@class,"title-name")]//a')
+REVIEWER_ID = etree.XPath('//a[contains(@id,"nickname")]')
+REVIEW_ITEMS = etree.XPath('//p[@class="kb-item-msg"]')
+# 每段内容对应的标题是它前面最近的 h1，评分在标题中的 span 里
+ITEM_TITLE = etree.XPath('preceding-sibling::h1[1]')
+TITLE_SCORE = etree.XPath('.//span')
+
+CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fa5]')
+
+UNKNOWN_REVIEWER = '未知用户'
+NO_SCORE = '无评分'
+
+
+def parse_review_page(content):
+    """从评价详情页 HTML 提取 {'车名', '用户ID', 标题: 内容, 标题评分: 评分}，找不到车名时返回 None
+
+    按每段内容找它自己的标题和评分，某段缺少标题或评分时不会错位到其他段落。
+    """
+    dom = html.fromstring(content)
+
+    car_name_elems = CAR_NAME(dom)
+    if not car_name_elems:
+        return None
+    reviewer_elems = REVIEWER_ID(dom)
+
+    review_data = {
+        '车名': car_name_elems[0].text_content().strip(),
+        '用户ID': reviewer_elems[0].text_content().strip() if reviewer_elems else UNKNOWN_REVIEWER,
+    }
+    for item in REVIEW_ITEMS(dom):
+        titles = ITEM_TITLE(item)
+        if not titles:
+            continue
+        # 仅保留标题中的中文字符；与之前的实现一致，包括评分 span 中的文字，CSV 的列名保持不变
+        title = ''.join(CHINESE_PATTERN.findall(titles[0].text_content()))
+        scores = TITLE_SCORE(titles[0])
+        review_data[title] = item.text_content().strip()
+        review_data[f'{title}评分'] = scores[0].text_content().strip() if scores else NO_SCORE
+    return review_data
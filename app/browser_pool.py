@@ -0,0 +1,246 @@
+import os
+from pathlib import Path
+from collections import defaultdict
+from metrics import METRICS
+
+# 工作页面分布在多少个浏览器上下文中
+BROWSER_CONTEXTS = int(os.environ.get('BROWSER_CONTEXTS', 2))
+# 每个上下文累计导航多少次后回收重建，0 表示不按次数回收
+RECYCLE_NAVIGATIONS = int(os.environ.get('BROWSER_RECYCLE_NAVIGATIONS', 500))
+# 爬虫进程树（含浏览器）的常驻内存超过该值（MB）时回收所有上下文，0 表示不检查
+MAX_RSS_MB = int(os.environ.get('BROWSER_MAX_RSS_MB', 2048))
+# 每导航多少次检查一次内存，遍历 /proc 有一定开销
+RSS_CHECK_EVERY = 20
+# 按内存回收之后，内存至少要下降这个比例才继续按内存回收；否则占用不在工作上下文中
+# （例如 main_context 中不断增长的列表页），回收只会反复重建上下文
+RSS_MIN_RELEASE = 0.1
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def process_tree_rss(root_pid):
+    """统计进程及其所有子进程的常驻内存（字节），不支持 /proc 的系统返回 None
+
+    Chromium 各进程之间有共享内存，这里是简单相加，结果偏大，只用作回收阈值。
+    """
+    proc = Path('/proc')
+    if not proc.exists():
+        return None
+    children = defaultdict(list)
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / 'stat').read_text()
+        except OSError:
+            continue
+        # 进程名可能包含空格和括号，从最后一个右括号之后解析
+        ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        children[ppid].append(int(entry.name))
+
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            total += int((proc / str(pid) / 'statm').read_text().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            pass
+        stack.extend(children[pid])
+    return total
+
+
+class ContextSlot:
+    """池中的一个工作上下文，记录导航次数、打开的页面和可复用的空闲页面"""
+
+    def __init__(self, context):
+        self.context = context
+        self.navigations = 0
+        self.open_pages = 0
+        self.idle_pages = []
+        self.retiring = False
+
+
+class BrowserPool:
+    """管理长时间爬取使用的浏览器和上下文
+
+    - 列表页等需要长期保持状态的页面放在 main_context 中，不参与回收；
+    - 详情页通过 acquire_page / release_page 从多个工作上下文中借还，页面处理完后留给下一次导航复用；
+    - 工作上下文导航达到 RECYCLE_NAVIGATIONS 次或进程树内存超过 MAX_RSS_MB 时标记为退役，
+      不再分配新页面，其中的页面都归还后关闭并换成新的上下文；按内存回收后内存没有下降时不再重复回收；
+    - 归还后留作复用的页面先导航到 about:blank，停止原页面的脚本和定时器；
+    - 浏览器崩溃或断开后由 restart_if_crashed 重新启动，generation 加一，
+      调用方据此判断之前打开的页面已经失效。
+    """
+
+    def __init__(self, playwright, logger, setup_context=None, contexts=BROWSER_CONTEXTS, idle_pages=4,
+                 recycle_navigations=RECYCLE_NAVIGATIONS, max_rss_mb=MAX_RSS_MB, **launch_options):
+        self.playwright = playwright
+        self.logger = logger
+        self.setup_context = setup_context
+        self.size = max(1, int(contexts))
+        self.idle_limit = idle_pages
+        self.recycle_navigations = recycle_navigations
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.launch_options = launch_options
+        self.generation = 0
+        self.navigations = 0
+        self.stats = defaultdict(int)
+        self.browser = None
+        self.main_context = None
+        self.slots = []
+        self.page_slots = {}
+        self.waiter = None
+        # 上一次按内存回收时的进程树内存，内存回到阈值以下后清空
+        self.recycled_rss = None
+        self.memory_recycle_paused = False
+        self.launch()
+
+    def new_context(self):
+        context = self.browser.new_context()
+        if self.setup_context:
+            self.setup_context(context)
+        return context
+
+    def launch(self):
+        self.browser = self.playwright.chromium.launch(**self.launch_options)
+        self.main_context = self.new_context()
+        self.slots = [ContextSlot(self.new_context()) for _ in range(self.size)]
+        self.page_slots = {}
+        self.waiter = None
+
+    def crashed(self):
+        return self.browser is None or not self.browser.is_connected()
+
+    def restart_if_crashed(self):
+        """浏览器已断开时重新启动，返回是否重启过"""
+        if not self.crashed():
+            return False
+        self.logger.warning("浏览器已断开，正在重新启动")
+        try:
+            self.browser.close()
+        except Exception:
+            pass
+        self.launch()
+        self.generation += 1
+        self.stats['restarts'] += 1
+        return True
+
+    def acquire_page(self):
+        """从打开页面最少的未退役上下文中取一个页面，优先复用空闲页面"""
+        self.check_memory()
+        slot = min((slot for slot in self.slots if not slot.retiring), key=lambda slot: slot.open_pages)
+        if slot.idle_pages:
+            page = slot.idle_pages.pop()
+            self.stats['pages_reused'] += 1
+        else:
+            page = slot.context.new_page()
+            self.stats['pages_created'] += 1
+        slot.open_pages += 1
+        slot.navigations += 1
+        self.navigations += 1
+        self.page_slots[page] = slot
+        if self.recycle_navigations and slot.navigations >= self.recycle_navigations:
+            self.retire(slot, f'导航 {slot.navigations} 次')
+        return page
+
+    def release_page(self, page, reuse=True):
+        """归还页面；出错的页面传 reuse=False 直接关闭。不是从池中取出的页面直接关闭"""
+        slot = self.page_slots.pop(page, None)
+        if slot is None:
+            self.close_page(page)
+            return
+        slot.open_pages -= 1
+        if reuse and not slot.retiring and len(slot.idle_pages) < self.idle_limit and self.blank(page):
+            slot.idle_pages.append(page)
+        else:
+            self.close_page(page)
+        if slot.retiring and slot.open_pages == 0:
+            self.replace(slot)
+
+    def wait(self, seconds):
+        """在 Playwright 线程上等待 seconds 秒，等待期间其他页面照常加载、路由回调照常执行
+
+        time.sleep 会阻塞同步 API 所在的线程，所有正在加载的页面都会停下来。
+        """
+        if seconds <= 0:
+            return
+        if self.waiter is None or self.waiter.is_closed():
+            self.waiter = self.main_context.new_page()
+        self.waiter.wait_for_timeout(seconds * 1000)
+
+    def blank(self, page):
+        """空闲页面导航到 about:blank，原页面的脚本不再运行；页面已关闭或导航失败时返回 False"""
+        if page.is_closed():
+            return False
+        try:
+            page.goto('about:blank')
+        except Exception:
+            return False
+        return True
+
+    def close_page(self, page):
+        try:
+            page.close()
+        except Exception:
+            pass
+
+    def retire(self, slot, reason):
+        if slot.retiring:
+            return
+        self.logger.info(f"回收浏览器上下文（{reason}）")
+        slot.retiring = True
+        for page in slot.idle_pages:
+            self.close_page(page)
+        slot.idle_pages = []
+        # 所有上下文都在退役时先补一个新的，保证始终有可分配的上下文
+        if all(other.retiring for other in self.slots):
+            self.slots.append(ContextSlot(self.new_context()))
+        if slot.open_pages == 0:
+            self.replace(slot)
+
+    def replace(self, slot):
+        self.slots.remove(slot)
+        try:
+            slot.context.close()
+        except Exception:
+            pass
+        self.stats['contexts_recycled'] += 1
+        if len(self.slots) < self.size:
+            self.slots.append(ContextSlot(self.new_context()))
+
+    def check_memory(self):
+        if not self.max_rss or self.navigations % RSS_CHECK_EVERY:
+            return
+        rss = process_tree_rss(os.getpid())
+        if rss is None:
+            return
+        METRICS.set_gauge('browser_rss_bytes', rss)
+        if rss <= self.max_rss:
+            self.recycled_rss = None
+            self.memory_recycle_paused = False
+            return
+        if self.recycled_rss is not None and rss > self.recycled_rss * (1 - RSS_MIN_RELEASE):
+            if not self.memory_recycle_paused:
+                self.logger.warning(f"回收上下文后内存仍为 {rss / 1024 / 1024:.0f}MB，占用不在工作上下文中，"
+                                    f"暂停按内存回收")
+                self.memory_recycle_paused = True
+            self.stats['memory_recycles_skipped'] += 1
+            return
+        self.recycled_rss = rss
+        self.memory_recycle_paused = False
+        for slot in list(self.slots):
+            self.retire(slot, f'内存 {rss / 1024 / 1024:.0f}MB 超过 {self.max_rss / 1024 / 1024:.0f}MB')
+
+    def summary(self):
+        return {'navigations': self.navigations, **self.stats}
+
+    def log_summary(self):
+        stats = self.summary()
+        self.logger.info("浏览器池统计: " + ', '.join(f'{name}={value}' for name, value in stats.items()))
+
+    def close(self):
+        try:
+            self.browser.close()
+        except Exception:
+            pass
@@ -0,0 +1,106 @@
+import json
+import time
+import sqlite3
+from pathlib import Path
+from metrics import METRICS
+
+
+class CheckpointStore:
+    """基于 SQLite 的断点记录，两个爬虫共用
+
+    每条记录按 (namespace, key) 单独写入，写入量与已抓取的总量无关；
+    每次写入都是一个事务，进程在任何时刻被杀掉都不会损坏已有记录。
+    """
+
+    def __init__(self, db_path, compact_every=1000):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # 多个 worker 容器共用同一个断点库时，等待其他进程的写锁而不是立即报错
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+        self.compact_every = compact_every
+        self.writes = 0
+
+    def get(self, namespace, key, default=None):
+        row = self.conn.execute('SELECT value FROM checkpoints WHERE namespace=? AND key=?',
+                                (namespace, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def keys(self, namespace):
+        return [row[0] for row in self.conn.execute('SELECT key FROM checkpoints WHERE namespace=?', (namespace,))]
+
+    def existing(self, namespace, keys):
+        """返回 keys 中已有记录的部分，用于批量去重"""
+        keys = list(keys)
+        found = set()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            found.update(row[0] for row in self.conn.execute(
+                f'SELECT key FROM checkpoints WHERE namespace=? AND key IN ({placeholders})', (namespace, *chunk)))
+        return found
+
+    def items(self, namespace):
+        return {key: json.loads(value) for key, value in
+                self.conn.execute('SELECT key, value FROM checkpoints WHERE namespace=?', (namespace,))}
+
+    def put(self, namespace, key, value=None):
+        self.put_many(namespace, {key: value})
+
+    def put_many(self, namespace, items):
+        self.write((namespace, key, value) for key, value in items.items())
+
+    def write(self, entries):
+        """在同一个事务中写入多条 (namespace, key, value)"""
+        now = time.time()
+        rows = [(namespace, key, json.dumps(value, ensure_ascii=False), now) for namespace, key, value in entries]
+        with METRICS.timer('progress_save'), self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO checkpoints (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)', rows)
+        self.after_write(len(rows))
+
+    def delete(self, namespace, key=None):
+        """删除一条记录；不指定 key 时删除整个命名空间"""
+        with self.conn:
+            if key is None:
+                self.conn.execute('DELETE FROM checkpoints WHERE namespace=?', (namespace,))
+            else:
+                self.conn.execute('DELETE FROM checkpoints WHERE namespace=? AND key=?', (namespace, key))
+        self.after_write(1)
+
+    def after_write(self, count):
+        self.writes += count
+        if self.writes >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """把 WAL 合并回主库并归还空闲页，避免日志和数据库文件无限增长"""
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.conn.execute('PRAGMA incremental_vacuum')
+        self.writes = 0
+
+    def migrate_json(self, json_file, convert):
+        """导入旧的 JSON 进度文件，convert(data) 返回 [(namespace, key, value)]；导入后将原文件改名"""
+        json_file = Path(json_file)
+        if not json_file.exists():
+            return False
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.write(convert(data))
+        json_file.rename(json_file.with_name(json_file.name + '.migrated'))
+        return True
+
+    def close(self):
+        self.compact()
+        self.conn.close()
@@ -0,0 +1,171 @@
+import io
+import os
+import csv
+import time
+from pathlib import Path
+from metrics import METRICS
+
+QUOTE = ord('"')
+NEWLINE = ord('\n')
+
+
+def find_record_start(buffer, quotes_after):
+    """在 buffer 中从后向前寻找记录边界
+
+    CSV 中换行符之后的引号数为偶数时它才是记录边界（否则在引号字段内部）。
+    返回 (记录起始位置或 None, 扫描完 buffer 后累计的引号数)。
+    """
+    for index in range(len(buffer) - 1, -1, -1):
+        byte = buffer[index]
+        if byte == QUOTE:
+            quotes_after += 1
+        elif byte == NEWLINE and quotes_after % 2 == 0:
+            return index + 1, quotes_after
+    return None, quotes_after
+
+
+def read_last_row(file_path, block_size=64 * 1024):
+    """从文件末尾向前读取最后一条记录，返回 dict；文件不存在或只有表头时返回 None"""
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'rb') as f:
+        header = f.readline()
+        header_end = f.tell()
+        end = f.seek(0, os.SEEK_END)
+        # 去掉文件末尾的换行
+        while end > header_end:
+            f.seek(end - 1)
+            if f.read(1) not in (b'\n', b'\r'):
+                break
+            end -= 1
+        if end <= header_end:
+            return None
+
+        tail = b''
+        pos = end
+        quotes_after = 0
+        while True:
+            read_size = min(block_size, pos - header_end)
+            pos -= read_size
+            f.seek(pos)
+            block = f.read(read_size)
+            start, quotes_after = find_record_start(block, quotes_after)
+            if start is not None:
+                tail = block[start:] + tail
+                break
+            tail = block + tail
+            if pos <= header_end:
+                break
+
+    reader = csv.DictReader(io.StringIO((header + tail).decode('utf-8'), newline=''))
+    return next(reader, None)
+
+
+def count_rows(file_path):
+    """完整扫描统计数据行数，只用于重建索引"""
+    with open(file_path, 'r', newline='', encoding='utf-8') as csv_file:
+        return max(sum(1 for _ in csv.reader(csv_file)) - 1, 0)
+
+
+def read_header(file_path):
+    with open(file_path, 'r', newline='', encoding='utf-8') as csv_file:
+        return next(csv.reader(csv_file), [])
+
+
+def iter_chunks(file_path, chunk_size=5000):
+    """逐块读取数据行，每次产出最多 chunk_size 行，内存占用与文件大小无关
+
+    行按表头宽度对齐：字段多于表头的行被跳过，少于表头的以 None 补齐，空字段也转为 None。
+    """
+    with open(file_path, 'r', newline='', encoding='utf-8') as csv_file:
+        reader = csv.reader(csv_file)
+        width = len(next(reader, []))
+        chunk = []
+        for row in reader:
+            if not row or len(row) > width:
+                continue
+            chunk.append([value or None for value in row] + [None] * (width - len(row)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class BufferedCsvWriter:
+    """长期持有的单文件 CSV 写入器
+
+    行先缓存在内存中，达到行数或时间阈值、或关闭时批量写入；写入后调用
+    on_flush(rows, tags) 以便调用方在数据落盘之后再提交进度。
+    新行出现表头中没有的列时，会以合并后的表头重写整个文件，保证各列对齐。
+    """
+
+    def __init__(self, file_path, batch_size=50, flush_interval=30, on_flush=None):
+        self.file_path = Path(file_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.fieldnames = read_header(self.file_path) if self.file_path.exists() else []
+        self.buffer = []
+        self.tags = []
+        self.last_flush = time.monotonic()
+
+    def write(self, row, tag=None):
+        self.buffer.append(row)
+        self.tags.append(tag)
+        if len(self.buffer) >= self.batch_size or self.flush_due():
+            self.flush()
+
+    def flush_due(self):
+        return bool(self.buffer) and time.monotonic() - self.last_flush >= self.flush_interval
+
+    def flush(self):
+        if not self.buffer:
+            return
+        rows, tags = self.buffer, self.tags
+        self.buffer, self.tags = [], []
+
+        known = set(self.fieldnames)
+        new_fields = []
+        for row in rows:
+            for key in row:
+                if key not in known:
+                    known.add(key)
+                    new_fields.append(key)
+
+        with METRICS.timer('csv_write'):
+            if not self.fieldnames or not self.file_path.exists():
+                self.fieldnames = self.fieldnames + new_fields
+                self.write_rows('w', rows, header=True)
+            elif new_fields:
+                self.rewrite(self.fieldnames + new_fields)
+                self.write_rows('a', rows)
+            else:
+                self.write_rows('a', rows)
+
+        self.last_flush = time.monotonic()
+        if self.on_flush:
+            self.on_flush(rows, tags)
+
+    def write_rows(self, mode, rows, header=False):
+        with open(self.file_path, mode, newline='', encoding='utf-8') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=self.fieldnames, restval='')
+            if header:
+                writer.writeheader()
+            writer.writerows(rows)
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
+
+    def rewrite(self, fieldnames):
+        """用新的表头重写已有数据，先写临时文件再原子替换"""
+        tmp_path = self.file_path.with_name(self.file_path.name + '.tmp')
+        with open(self.file_path, 'r', newline='', encoding='utf-8') as src, \
+                open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+            writer = csv.DictWriter(dst, fieldnames=fieldnames, restval='', extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(csv.DictReader(src))
+        os.replace(tmp_path, self.file_path)
+        self.fieldnames = fieldnames
+
+    def close(self):
+        self.flush()
@@ -1,13 +1,40 @@
+import os
 import re
 import time
-import csv
-import json
 import logging
 from pathlib import Path
 from datetime import datetime
 from logging import handlers
-from lxml import html
+from collections import deque
 from playwright.sync_api import sync_playwright
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from page_window import PageWindow
+from discovery import LIBRARY_DISCOVERY
+from browser_pool import BrowserPool
+from work_queue import WorkQueue
+from checkpoint import CheckpointStore
+from page_archive import PageArchive, ARCHIVE_ENABLED
+from dcd_api import create_session, fetch_param_data
+from dcd_parser import parse_param_table
+from routing import RoutingPolicy
+from metrics import METRICS
+from rate_limit import AdaptiveRateLimiter, RetryQueue, BlockedError
+from readiness import wait_ready, wait_for_growth, log_wait_summary
+
+# 同时打开并解析的参数页数量
+CONCURRENCY = int(os.environ.get('DCD_CONCURRENCY', 4))
+# 参数获取方式：api 先直接请求页面内嵌的 JSON，失败再回退到浏览器；browser 只用浏览器
+FETCH_MODE = os.environ.get('DCD_FETCH_MODE', 'api')
+API_WORKERS = int(os.environ.get('DCD_API_WORKERS', 8))
+# 运行模式：standalone 自己发现并抓取；coordinator 只滚动车型库并把车型放入任务队列；worker 只从队列领取车型抓取
+MODE = os.environ.get('DCD_MODE', 'standalone')
+# worker 每次领取的车型数量
+WORK_BATCH = max(CONCURRENCY, API_WORKERS)
+WORK_QUEUE = 'dcd_params'
+# 重抓模式：距上次获取超过该小时数的车型重新获取参数，0 表示已抓取的车型不再访问
+RECRAWL_TTL_HOURS = float(os.environ.get('DCD_RECRAWL_TTL_HOURS', 0))
+# 每次运行最多重抓的车型数量，0 表示不限；按车型库中的顺序，靠前的热门车型优先
+RECRAWL_LIMIT = int(os.environ.get('DCD_RECRAWL_LIMIT', 0))
 
 def create_directory(path):
     directory = Path(path)
@@ -20,15 +47,24 @@ def create_directory(path):
 def sanitize_filename(filename):
     return re.sub(r'[\\/*?:"<>|]', '_', filename)
 
-def load_processed_cars(json_file):
-    if Path(json_file).exists():
-        with open(json_file, 'r', encoding='utf-8') as f:
-            return set(json.load(f))
-    return set()
-
-def save_processed_cars(json_file, car_names):
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(list(car_names), f, ensure_ascii=False, indent=4)
+def load_processed_cars(store, json_file):
+    """返回 {车名: 记录}，记录包含 processed_at（最近一次写入）、hash（参数内容哈希）和 checked_at（最近一次获取）"""
+    # 旧版本把全部车名写在 processed_cars.json 中，首次运行时导入断点库
+    if store.migrate_json(json_file, lambda names: [('dcd_processed', name, None) for name in names]):
+        logger.info(f"已将 {json_file} 导入断点库")
+    return {car_name: record or {} for car_name, record in store.items('dcd_processed').items()}
+
+def save_processed_car(store, car_name, record):
+    store.put('dcd_processed', car_name, record)
+
+def recrawl_due(record, now):
+    """已抓取的车型是否到了重抓时间；没有获取时间的旧记录按写入时间计算"""
+    if not RECRAWL_TTL_HOURS:
+        return False
+    checked_at = record.get('checked_at')
+    if checked_at is None and record.get('processed_at'):
+        checked_at = datetime.fromisoformat(record['processed_at']).timestamp()
+    return checked_at is None or now - checked_at >= RECRAWL_TTL_HOURS * 3600
 
 def setup_logging():
     global logger
@@ -55,7 +91,7 @@ def setup_logging():
     logger.addHandler(console_handler)
     logger.addHandler(file_handler)
 
-def generate_report(processed_cars, failed_cars):
+def generate_report(processed_cars, failed_cars, metrics_lines=()):
     report_dir = Path('dcd_data') / 'reports'
     create_directory(report_dir)
     report_filename = report_dir / f"report_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt"
@@ -71,17 +107,26 @@ def generate_report(processed_cars, failed_cars):
         report_file.write("\n抓取失败的车辆列表:\n")
         for car in failed_cars:
             report_file.write(f" - {car}\n")
+        report_file.write("\n运行指标:\n")
+        for line in metrics_lines:
+            report_file.write(f" - {line}\n")
 
     logger.info(f"报告已生成：{report_filename}")
 
+def save_param_csv(csv_file_path, table):
+    with METRICS.timer('csv_write'), open(csv_file_path, 'w', newline='', encoding='utf-8') as csv_file:
+        csv_file.write(table.csv_text())
+
 def run(playwright):
     setup_logging()
 
     base_output_dir = 'dcd_data'
     create_directory(base_output_dir)
+    # metrics.json / metrics.prom 在运行中定期覆盖写出
+    METRICS.directory = Path(base_output_dir) / 'reports'
 
-    processed_cars_file = Path(base_output_dir) / 'processed_cars.json'
-    processed_cars = load_processed_cars(processed_cars_file)
+    store = CheckpointStore(Path(base_output_dir) / 'checkpoints.db')
+    processed_cars = load_processed_cars(store, Path(base_output_dir) / 'processed_cars.json')
 
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -89,134 +134,284 @@ def run(playwright):
         "Accept-Encoding": "gzip, deflate, br"
     }
 
-    browser = playwright.chromium.launch(headless=True)
-    context = browser.new_context()
-    page = context.new_page()
-
-    def handle_request(route, request):
-        route.continue_(headers={**request.headers, **headers})
-    
-    page.route("**/*", handle_request)
-    
-    page.goto("https://www.dongchedi.com/auto/library/x-x-x-x-x-x-x-x-x-x-x")
-
-    car_data = {}
-    previous_height = 0
-    max_retries = 3
-    retries = 0
-    failed_cars = []
-
-    while True:
-        car_cards = page.query_selector_all('//div[contains(@class,"car-list_card")]')
-        logger.info(f"Found {len(car_cards)} car cards.")
-
-        new_cards = 0
-        for car_card in car_cards:
-            car_name = car_card.query_selector('//a[contains(@class,"card_name")]').inner_text().strip()
-            if car_name not in car_data and car_name not in processed_cars:
-                car_data[car_name] = car_card
-                new_cards += 1
+    # 多容器运行时共享卷上的任务队列；coordinator 在启动浏览器之前先开始新一轮，
+    # 同时启动的 worker 不会因为上一轮留下的关闭状态直接退出
+    work_queue = WorkQueue(Path(base_output_dir) / 'work_queue.db') if MODE != 'standalone' else None
+    if MODE == 'coordinator':
+        work_queue.open(WORK_QUEUE)
 
-        if new_cards > 0:
-            logger.info(f"{new_cards} new car cards found, starting to scrape...")
+    # 每个上下文（包括回收和重启后新建的）都注册路由，带上请求头并屏蔽图片、字体等无用资源
+    routing = RoutingPolicy.from_env('dcd', headers)
+    pool = BrowserPool(playwright, logger, setup_context=routing.install, headless=True)
 
-            for car_name, car_card in car_data.items():
-                if car_name in processed_cars:
-                    continue
+    def open_library():
+        library_page = pool.main_context.new_page()
+        library_page.goto("https://www.dongchedi.com/auto/library/x-x-x-x-x-x-x-x-x-x-x")
+        wait_ready(library_page, 'dcd', 'library')
+        return library_page
 
-                try:
-                    car_name_out = car_name
-                    param_button = car_card.query_selector('//a[contains(text(),"参数")]')
-                    if param_button:
-                        with context.expect_page() as new_page_info:
-                            param_button.click()
-
-                        new_page = new_page_info.value
-                        new_page.wait_for_load_state("networkidle")
-                        time.sleep(2)
-                        content = new_page.content()
-                        dom = html.fromstring(content)
-
-                        car_names = dom.xpath('//a[contains(@class,"cell_car")]/text()')
-                        car_name_texts = [name.strip() for name in car_names]
-
-                        attribute_names = dom.xpath('//label/text()')
-                        attribute_names = [attr.strip() for attr in attribute_names]
-
-                        car_data_dict = {name: {attr: '' for attr in attribute_names} for name in car_name_texts}
-
-                        prices = dom.xpath('//div[contains(@class,"official-price")]/text()')
-                        price_texts = [price.strip() for price in prices]
-
-                        for i, car_name in enumerate(car_name_texts):
-                            if i < len(price_texts):
-                                car_data_dict[car_name]['官方指导价'] = price_texts[i]
-
-                        xpath_value = '//div[@data-row-anchor]/parent::*/div[contains(@class,"table_row") and not(contains(@class,"title"))]'
-                        value_elements = dom.xpath(xpath_value)
-                        for elem in value_elements:
-                            nested_elem = elem.xpath('./div[contains(@class,"nest")]')
-                            if nested_elem:
-                                nested_rows = elem.xpath('.//div[contains(@class,"table_row")]')
-                                for row_index, row in enumerate(nested_rows):
-                                    for col_index in range(len(car_name_texts)):
-                                        index_texts = row.xpath(f'.//div[contains(@style,"index:{col_index + 1}")]//text()')
-                                        index_texts = [text.strip() for text in index_texts if text.strip()]
-                                        if index_texts:
-                                            attribute_value = " ".join(index_texts)
-                                            car_data_dict[car_name_texts[col_index]][attribute_names[value_elements.index(elem)]] = attribute_value
-                            else:
-                                cell_normal_elements = elem.xpath('.//div[contains(@class,"cell_normal")]')
-                                for i, cell in enumerate(cell_normal_elements):
-                                    if cell.xpath('.//img'):
-                                        text = 'NULL'
-                                    else:
-                                        text = cell.text_content().strip()
-                                    if text:
-                                        car_data_dict[car_name_texts[i]][attribute_names[value_elements.index(elem)]] = text
-
-                        csv_file_path = Path(base_output_dir) / sanitize_filename(f'{car_name_out}_参数.csv')
-                        with open(csv_file_path, 'w', newline='', encoding='utf-8') as csv_file:
-                            writer = csv.DictWriter(csv_file, fieldnames=['车名'] + attribute_names)
-                            writer.writeheader()
-                            for car in car_name_texts:
-                                row = {'车名': car}
-                                row.update(car_data_dict[car])
-                                writer.writerow(row)
-
-                        logger.info(f"数据已保存到 {csv_file_path}")
-
-                        # 记录抓取成功的车名
-                        processed_cars.add(car_name_out)
-                        save_processed_cars(processed_cars_file, processed_cars)
-
-                        new_page.close()
-
-                except Exception as e:
-                    logger.error(f"抓取 {car_name} 信息时出错：{e}")
-                    failed_cars.append(car_name)
-
-            if failed_cars:
-                logger.warning(f"以下车辆的数据抓取失败：{', '.join(failed_cars)}")
-
-        last_height = page.evaluate("document.body.scrollHeight")
-        page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-        page.wait_for_load_state("networkidle")
-        time.sleep(2)
-        new_height = page.evaluate("document.body.scrollHeight")
-
-        if new_height == last_height:
-            retries += 1
-            if retries >= max_retries:
-                logger.info("No more new content to load. Stopping scrolling.")
-                break
+    failed_cars = []
+    limiter = AdaptiveRateLimiter()
+    window = PageWindow(pool, CONCURRENCY, limiter=limiter)
+    # 单机运行时失败的车型退避后重试；worker 模式由任务队列负责重试
+    retry_queue = RetryQueue() if MODE == 'standalone' else None
+    # 车名 -> 参数页URL，重试时使用
+    car_urls = {}
+
+    METRICS.collect('browser_pool', pool.summary)
+    METRICS.collect('routing', routing.summary)
+    METRICS.collect('rate_limit', limiter.summary, label='domain')
+
+    # 保存原始页面，解析逻辑修改后可以用 page_archive.py 离线重新解析
+    archive = PageArchive(Path(base_output_dir) / 'archive') if ARCHIVE_ENABLED else None
+    if archive:
+        METRICS.collect('page_archive', archive.summary)
+
+    session = create_session(headers, API_WORKERS) if FETCH_MODE == 'api' else None
+    executor = ThreadPoolExecutor(max_workers=API_WORKERS) if FETCH_MODE == 'api' else None
+
+    def save_car(car_name, table, source):
+        csv_file_path = Path(base_output_dir) / sanitize_filename(f'{car_name}_参数.csv')
+        content_hash = table.content_hash()
+        record = processed_cars.get(car_name, {})
+        # 参数没有变化时不重写 CSV，文件的大小和修改时间不变，导入数据库时也会跳过
+        if record.get('hash') == content_hash and csv_file_path.exists():
+            logger.info(f"{car_name} 参数未变化，保留 {csv_file_path}")
+            result = 'unchanged'
         else:
-            retries = 0
-
-    generate_report(processed_cars, failed_cars)
+            save_param_csv(csv_file_path, table)
+            logger.info(f"数据已保存到 {csv_file_path}")
+            result = 'changed' if car_name in processed_cars else 'new'
+            record = dict(record, processed_at=datetime.now().isoformat(), hash=content_hash)
+        METRICS.inc('pages_total', kind='param', source=source)
+        METRICS.inc('param_results_total', result=result)
+
+        # 记录抓取成功的车名和本次获取的时间
+        processed_cars[car_name] = dict(record, checked_at=time.time())
+        save_processed_car(store, car_name, processed_cars[car_name])
+
+    def scrape_param_page(car_name, new_page):
+        if not wait_ready(new_page, 'dcd', 'param'):
+            # 还没有在售车款的车型没有参数表，记为已检查，到期后再重新访问
+            logger.info(f"{car_name} 的参数页没有车款，跳过")
+            METRICS.inc('param_results_total', result='empty')
+            processed_cars[car_name] = dict(processed_cars.get(car_name, {}), checked_at=time.time())
+            save_processed_car(store, car_name, processed_cars[car_name])
+            return
+        with METRICS.timer('dom_extract'):
+            content = new_page.content()
+        if archive:
+            archive.save('dcd_params', car_name, new_page.url, content, format='dom')
+        with METRICS.timer('parse'):
+            table = parse_param_table(content)
+        save_car(car_name, table, 'browser')
+
+    def archiver(car_name, url):
+        """直接请求成功时保存页面，在请求线程中调用"""
+        if not archive:
+            return None
+        return lambda content: archive.save('dcd_params', car_name, url, content, format='next_data')
+
+    def scrape_via_api(queue):
+        """并发直接请求参数页，返回需要回退到浏览器抓取的队列"""
+        fallback = deque()
+        futures = {executor.submit(fetch_param_data, session, url, limiter=limiter,
+                                   on_content=archiver(car_name, url)): (car_name, url)
+                   for car_name, url in queue}
+        queue.clear()
+        for future in as_completed(futures):
+            car_name, url = futures[future]
+            try:
+                result = future.result()
+            except BlockedError as e:
+                # 被拦截时用浏览器打开同样会被拦截，等限速器冷却后再重试
+                on_error(car_name, e, blocked=True)
+                continue
+            except Exception as e:
+                logger.warning(f"直接请求 {car_name} 参数失败，回退到浏览器：{e}")
+                METRICS.failure(e, stage='api')
+                METRICS.inc('api_fallback_total', reason='error')
+                fallback.append((car_name, url))
+                continue
+            if result is None:
+                # 页面请求成功却没有参数数据，大量出现说明内嵌 JSON 的结构变了或响应没有被正确解压
+                logger.warning(f"直接请求 {car_name} 的页面中没有参数数据，回退到浏览器")
+                METRICS.inc('api_fallback_total', reason='no_data')
+                fallback.append((car_name, url))
+                continue
+            try:
+                save_car(car_name, result, 'api')
+            except Exception as e:
+                on_error(car_name, e)
+        return fallback
+
+    def on_error(car_name, e, blocked=False):
+        logger.error(f"抓取 {car_name} 信息时出错：{e}")
+        METRICS.failure(e, stage='scrape')
+        if retry_queue is not None and retry_queue.add(car_name, car_urls[car_name], blocked):
+            logger.info(f"{car_name} 已加入重试队列（第 {retry_queue.attempts[car_name]} 次）")
+            return
+        failed_cars.append(car_name)
+
+    def scrape_batch(queue):
+        """抓取队列中的 (车名, 参数页URL)，api 模式下失败的回退到浏览器"""
+        car_urls.update(queue)
+        if FETCH_MODE == 'api':
+            queue = scrape_via_api(queue)
+        window.process(queue, scrape_param_page, on_error)
+
+    def work():
+        """worker 模式：从任务队列领取车型，抓取后标记完成或失败，队列关闭且排空后退出"""
+        for leased in work_queue.iter_leases(WORK_QUEUE, WORK_BATCH):
+            car_names = [car_name for car_name, _ in leased]
+            logger.info(f"Leased {len(car_names)} cars: {', '.join(car_names)}")
+            failed_before = len(failed_cars)
+            with work_queue.keep_alive(WORK_QUEUE, car_names):
+                # 是否到期由 coordinator 判断，worker 不按自己的 DCD_RECRAWL_TTL_HOURS 重新判断
+                scrape_batch(deque((car_name, task['url']) for car_name, task in leased
+                                   if car_name not in processed_cars or task.get('recrawl')))
+            failed = set(failed_cars[failed_before:])
+            for car_name in car_names:
+                if car_name in failed:
+                    recorded = work_queue.fail(WORK_QUEUE, car_name, '抓取失败')
+                else:
+                    recorded = work_queue.complete(WORK_QUEUE, car_name)
+                if not recorded:
+                    logger.warning(f"{car_name} 的租约已过期并被其他 worker 领取，不更新任务状态")
+            METRICS.maybe_export()
+        logger.info(f"任务队列已排空: {work_queue.counts(WORK_QUEUE)}")
+
+    def crawl_library():
+        """滚动车型库发现车型；coordinator 模式只入队，其他模式直接抓取
+
+        新车型边滚动边抓取；到期需要重抓的已抓取车型按车型库中的顺序记下，滚动结束后再处理。
+        """
+        page = open_library()
+        generation = pool.generation
+        seen_cars = set()
+        # 到期需要重抓的 (车名, 参数页URL)
+        recrawl_cars = []
+        max_retries = 3
+        retries = 0
+
+        # 待抓取的 (车名, 参数页URL) 队列，由滚动发现的车辆卡片填充
+        param_queue = deque()
+
+        while True:
+            if pool.generation != generation:
+                # 浏览器重启后车型库页面已失效，重新打开并从头滚动，已抓取的车型会被跳过
+                logger.warning("浏览器已重启，重新打开车型库页面")
+                page = open_library()
+                generation = pool.generation
+                retries = 0
+
+            try:
+                # 一次 evaluate 只取回本次滚动新出现的卡片
+                discovered = LIBRARY_DISCOVERY.discover(page)
+            except Exception:
+                if pool.restart_if_crashed():
+                    continue
+                raise
 
-    page.wait_for_timeout(1000)
-    browser.close()
+            new_cards = 0
+            now = time.time()
+            for car_name, url in discovered:
+                if car_name in seen_cars:
+                    continue
+                seen_cars.add(car_name)
+                if not url:
+                    logger.warning(f"{car_name} 没有找到参数页链接")
+                elif car_name not in processed_cars:
+                    new_cards += 1
+                    param_queue.append((car_name, url))
+                elif recrawl_due(processed_cars[car_name], now) and \
+                        (not RECRAWL_LIMIT or len(recrawl_cars) < RECRAWL_LIMIT):
+                    recrawl_cars.append((car_name, url))
+            logger.info(f"Found {len(discovered)} new car cards.")
+
+            # 已到重试时间的失败车型随新车型一起抓取
+            if retry_queue:
+                param_queue.extend(retry_queue.pop_due())
+
+            # 浏览器重启前已发现但没来得及抓取的车型仍在队列中，重启后一并处理
+            if param_queue:
+                logger.info(f"{new_cards} new car cards found, {len(param_queue)} cars to scrape with {window.size} pages...")
+
+                if work_queue:
+                    added = work_queue.enqueue(WORK_QUEUE, {car_name: {'url': url} for car_name, url in param_queue})
+                    logger.info(f"已将 {added} 个车型放入任务队列")
+                    param_queue.clear()
+                else:
+                    scrape_batch(param_queue)
+
+                if failed_cars:
+                    logger.warning(f"以下车辆的数据抓取失败：{', '.join(failed_cars)}")
+
+            METRICS.maybe_export()
+
+            if pool.generation != generation:
+                continue
+
+            try:
+                last_height = page.evaluate("document.body.scrollHeight")
+                page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                grew = wait_for_growth(page, 'dcd', 'library', last_height)
+            except Exception:
+                if pool.restart_if_crashed():
+                    continue
+                raise
+
+            if not grew:
+                retries += 1
+                if retries >= max_retries:
+                    logger.info("No more new content to load. Stopping scrolling.")
+                    break
+            else:
+                retries = 0
+
+        if recrawl_cars:
+            logger.info(f"{len(recrawl_cars)} 个车型超过 {RECRAWL_TTL_HOURS:g} 小时未更新，重新获取参数")
+            if work_queue:
+                # 已完成的任务需要重新置为待处理
+                added = work_queue.enqueue(WORK_QUEUE, {car_name: {'url': url, 'recrawl': True}
+                                                        for car_name, url in recrawl_cars},
+                                           reset=True)
+                logger.info(f"已将 {added} 个重抓车型放入任务队列")
+            else:
+                for start in range(0, len(recrawl_cars), WORK_BATCH):
+                    scrape_batch(deque(recrawl_cars[start:start + WORK_BATCH]))
+                    METRICS.maybe_export()
+
+    if MODE == 'worker':
+        work()
+    else:
+        crawl_library()
+        if work_queue:
+            work_queue.close(WORK_QUEUE)
+            logger.info(f"入队完毕: {work_queue.counts(WORK_QUEUE)}")
+
+    # 生成报告之前，等待并重试所有仍在重试队列中的车型
+    if retry_queue:
+        for batch in retry_queue.drain(sleep=pool.wait):
+            logger.info(f"重试 {len(batch)} 个失败的车型")
+            scrape_batch(deque(batch))
+
+    METRICS.export()
+    generate_report(processed_cars, failed_cars, METRICS.summary_lines())
+    log_wait_summary(logger)
+    routing.log_summary(logger)
+    limiter.log_summary(logger)
+    pool.log_summary()
+
+    if executor:
+        executor.shutdown()
+        session.close()
+    if archive:
+        archive.log_summary(logger)
+        archive.close()
+
+    store.close()
+    pool.close()
 
 with sync_playwright() as playwright:
     run(playwright)
@@ -0,0 +1,114 @@
+import json
+import time
+import requests
+from lxml import html
+from requests.adapters import HTTPAdapter
+from dcd_parser import ParamTable
+from rate_limit import domain_of, detect_block, BlockedError
+from metrics import METRICS
+
+# 参数页是服务端渲染的 Next.js 页面，完整参数数据以 JSON 形式嵌在这个脚本标签里
+NEXT_DATA_XPATH = '//script[@id="__NEXT_DATA__"]/text()'
+
+
+def create_session(headers, pool_size):
+    """创建复用连接的 HTTP 会话，连接池大小与并发线程数一致
+
+    不沿用浏览器的 Accept-Encoding：没有安装 brotli 时 requests 无法解压 br 响应，
+    由 requests 只声明自己能解压的编码。
+    """
+    session = requests.Session()
+    session.headers.update({name: value for name, value in headers.items() if name.lower() != 'accept-encoding'})
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=1)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def extract_raw_data(content):
+    """从参数页HTML中取出 pageProps.rawData，找不到时返回 None"""
+    scripts = html.fromstring(content).xpath(NEXT_DATA_XPATH)
+    if not scripts:
+        return None
+    next_data = json.loads(scripts[0])
+    return next_data.get('props', {}).get('pageProps', {}).get('rawData')
+
+
+def cell_value(cell):
+    """将单元格数据转换为与页面解析一致的文本，图标单元格记为 NULL"""
+    if isinstance(cell, dict):
+        sub_list = cell.get('sub_list')
+        if sub_list:
+            values = [str(sub.get('value', '')).strip() for sub in sub_list if isinstance(sub, dict)]
+            return ' '.join(value for value in values if value)
+        value = str(cell.get('value') or '').strip()
+        if not value and cell.get('icon_type'):
+            return 'NULL'
+        return value
+    return str(cell).strip() if cell is not None else ''
+
+
+def build_param_table(raw_data):
+    """由 rawData 构建与页面解析结果相同的 ParamTable，结构不符时返回 None"""
+    if not isinstance(raw_data, dict):
+        return None
+    properties = raw_data.get('properties') or []
+    car_info = raw_data.get('car_info') or []
+    if not properties or not car_info:
+        return None
+
+    # 只保留至少一个车型有取值的属性，分组标题行没有取值
+    present_keys = set()
+    for car in car_info:
+        present_keys.update((car.get('info') or {}).keys())
+    attributes = [(prop['key'], prop['text'].strip()) for prop in properties
+                  if prop.get('key') in present_keys and prop.get('text')]
+    if not attributes:
+        return None
+
+    trims = [str(car.get('car_name', '')).strip() for car in car_info]
+    prices = [str(car.get('official_price') or '').strip() for car in car_info]
+    table = ParamTable(trims, [text for _, text in attributes], prices)
+
+    for trim_index, car in enumerate(car_info):
+        info = car.get('info') or {}
+        for attribute_index, (key, _) in enumerate(attributes):
+            value = cell_value(info.get(key))
+            if value:
+                table.set(attribute_index, trim_index, value)
+
+    return table
+
+
+def fetch_param_data(session, url, timeout=15, limiter=None, on_content=None):
+    """直接请求参数页并从嵌入的 JSON 构建参数表，失败时返回 None 以便回退到浏览器抓取
+
+    传入 limiter 时按域名限速，并把耗时和结果反馈给限速器；被反爬拦截时抛出 BlockedError。
+    成功构建参数表时调用 on_content(页面内容)，例如保存原始页面。
+    """
+    domain = domain_of(url)
+    if limiter:
+        limiter.acquire(domain)
+    start = time.perf_counter()
+    try:
+        with METRICS.timer('api_fetch'):
+            response = session.get(url, timeout=timeout)
+    except requests.RequestException:
+        if limiter:
+            limiter.record(domain, ok=False)
+        raise
+
+    table = None
+    if response.ok:
+        with METRICS.timer('parse'):
+            table = build_param_table(extract_raw_data(response.content))
+    # 只有结果不正常时才检查是否被拦截，避免每次都解码整个页面
+    blocked = table is None and detect_block(response.status_code, response.url, response.text)
+    if limiter:
+        limiter.record(domain, time.perf_counter() - start, ok=response.ok, blocked=blocked)
+    if blocked:
+        raise BlockedError(f'{url} 被反爬拦截（HTTP {response.status_code}）')
+    response.raise_for_status()
+    if table is not None and on_content:
+        on_content(response.content)
+    return table
@@ -0,0 +1,114 @@
+import io
+import re
+import csv
+import json
+import hashlib
+from lxml import etree, html
+
+# 预编译的 XPath，整个参数页只解析一次 DOM
+CAR_NAMES = etree.XPath('//a[contains(@class,"cell_car")]/text()')
+ATTRIBUTE_NAMES = etree.XPath('//label/text()')
+PRICES = etree.XPath('//div[contains(@class,"official-price")]/text()')
+VALUE_ROWS = etree.XPath('//div[@data-row-anchor]/parent::*/div[contains(@class,"table_row") and not(contains(@class,"title"))]')
+NEST = etree.XPath('./div[contains(@class,"nest")]')
+NESTED_ROWS = etree.XPath('.//div[contains(@class,"table_row")]')
+INDEXED_CELLS = etree.XPath('.//div[contains(@style,"index:")]')
+NORMAL_CELLS = etree.XPath('.//div[contains(@class,"cell_normal")]')
+HAS_IMAGE = etree.XPath('boolean(.//img)')
+
+INDEX_PATTERN = re.compile(r'index:(\d+)')
+
+
+class ParamTable:
+    """参数表的列式表示，values[属性序号][车型序号] 为单元格文本"""
+
+    def __init__(self, trims, attributes, prices=None):
+        self.trims = trims
+        self.attributes = attributes
+        self.prices = prices or []
+        self.values = [[''] * len(trims) for _ in attributes]
+
+    @property
+    def fieldnames(self):
+        return ['车名'] + self.attributes
+
+    def set(self, attribute_index, trim_index, value):
+        self.values[attribute_index][trim_index] = value
+
+    def to_car_data_dict(self):
+        """转换为 {车型名: {属性名: 值}}，同名属性以后出现的非空值为准"""
+        car_data_dict = {trim: {attr: '' for attr in self.attributes} for trim in self.trims}
+        for trim, price in zip(self.trims, self.prices):
+            if price and '官方指导价' in car_data_dict[trim]:
+                car_data_dict[trim]['官方指导价'] = price
+        for attr, row in zip(self.attributes, self.values):
+            for trim, value in zip(self.trims, row):
+                if value:
+                    car_data_dict[trim][attr] = value
+        return car_data_dict
+
+    def rows(self):
+        car_data_dict = self.to_car_data_dict()
+        for trim in self.trims:
+            row = {'车名': trim}
+            row.update(car_data_dict[trim])
+            yield row
+
+    def csv_text(self):
+        """参数表写入 CSV 的完整内容，写文件时以 newline='' 打开"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=self.fieldnames)
+        writer.writeheader()
+        writer.writerows(self.rows())
+        return buffer.getvalue()
+
+    def content_hash(self):
+        """按写入 CSV 的内容计算哈希，浏览器和直接请求两种方式得到相同的参数时哈希相同"""
+        digest = hashlib.sha256(json.dumps(self.fieldnames, ensure_ascii=False).encode('utf-8'))
+        for row in self.rows():
+            digest.update(json.dumps(list(row.values()), ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+
+
+def parse_nested_row(table, attribute_index, elem):
+    """嵌套行按 style 中的 index:N 把文本归到第 N 个车型，多行时以最后一行的非空值为准"""
+    trim_count = len(table.trims)
+    for row in NESTED_ROWS(elem):
+        texts = {}
+        for cell in INDEXED_CELLS(row):
+            match = INDEX_PATTERN.search(cell.get('style', ''))
+            # 只有 z-index: N 之类的样式，不是车型列
+            if match is None:
+                continue
+            col_index = int(match.group(1)) - 1
+            if 0 <= col_index < trim_count:
+                texts.setdefault(col_index, []).extend(text.strip() for text in cell.itertext() if text.strip())
+        for col_index, cell_texts in texts.items():
+            if cell_texts:
+                table.set(attribute_index, col_index, ' '.join(cell_texts))
+
+
+def parse_normal_row(table, attribute_index, elem):
+    """普通行的第 i 个单元格对应第 i 个车型，图标单元格记为 NULL"""
+    for col_index, cell in enumerate(NORMAL_CELLS(elem)[:len(table.trims)]):
+        text = 'NULL' if HAS_IMAGE(cell) else cell.text_content().strip()
+        if text:
+            table.set(attribute_index, col_index, text)
+
+
+def parse_param_table(content):
+    """解析参数页HTML，返回 ParamTable"""
+    dom = html.fromstring(content)
+
+    trims = [name.strip() for name in CAR_NAMES(dom)]
+    attributes = [attr.strip() for attr in ATTRIBUTE_NAMES(dom)]
+    prices = [price.strip() for price in PRICES(dom)]
+    table = ParamTable(trims, attributes, prices)
+
+    for attribute_index, elem in enumerate(VALUE_ROWS(dom)[:len(attributes)]):
+        if NEST(elem):
+            parse_nested_row(table, attribute_index, elem)
+        else:
+            parse_normal_row(table, attribute_index, elem)
+
+    return table
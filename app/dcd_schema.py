@@ -0,0 +1,81 @@
+import re
+
+NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+
+# 车型表中的强类型列，用于跨车系筛选
+TYPED_COLUMNS = {
+    'price_wan': 'REAL',
+    'level': 'TEXT',
+    'energy_type': 'TEXT',
+    'range_km': 'REAL',
+    'power_kw': 'REAL',
+    'length_mm': 'REAL',
+    'width_mm': 'REAL',
+    'height_mm': 'REAL',
+    'wheelbase_mm': 'REAL',
+    'seats': 'INTEGER',
+}
+
+
+def parse_number(text):
+    """取文本中的第一个数字，没有数字时返回 None"""
+    if not text:
+        return None
+    match = NUMBER_PATTERN.search(text.replace(',', ''))
+    return float(match.group()) if match else None
+
+
+def parse_price_wan(text):
+    """将指导价统一为以万元为单位，例如 '12.98万' -> 12.98、'129800元' -> 12.98"""
+    number = parse_number(text)
+    if number is None:
+        return None
+    if '万' not in text and number >= 1000:
+        return number / 10000
+    return number
+
+
+def parse_dimensions(text):
+    """解析 '4765x1900x1675' 形式的长宽高"""
+    numbers = [float(n) for n in NUMBER_PATTERN.findall(text or '')]
+    return numbers if len(numbers) == 3 else None
+
+
+def extract_typed(record):
+    """从 {属性名: 值} 中提取强类型列，属性名按常见写法模糊匹配"""
+    typed = dict.fromkeys(TYPED_COLUMNS)
+    range_priority = None
+    power_fallback = None
+
+    for label, value in record.items():
+        if not value or value == 'NULL':
+            continue
+        if label.startswith('官方指导价'):
+            typed['price_wan'] = parse_price_wan(value)
+        elif label == '级别':
+            typed['level'] = value
+        elif label.startswith('能源类型'):
+            typed['energy_type'] = value
+        elif '纯电续航里程' in label:
+            # 优先使用 CLTC 工况，其次 WLTC、NEDC 等
+            priority = 0 if 'CLTC' in label else 1
+            if range_priority is None or priority < range_priority:
+                typed['range_km'] = parse_number(value)
+                range_priority = priority
+        elif label.startswith('最大功率'):
+            typed['power_kw'] = parse_number(value)
+        elif label.startswith('电动机总功率'):
+            power_fallback = parse_number(value)
+        elif '长x宽x高' in label or '长*宽*高' in label:
+            dimensions = parse_dimensions(value)
+            if dimensions:
+                typed['length_mm'], typed['width_mm'], typed['height_mm'] = dimensions
+        elif label.startswith('轴距'):
+            typed['wheelbase_mm'] = parse_number(value)
+        elif label.startswith('座位数'):
+            seats = parse_number(value)
+            typed['seats'] = int(seats) if seats is not None else None
+
+    if typed['power_kw'] is None:
+        typed['power_kw'] = power_fallback
+    return typed
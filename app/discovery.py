@@ -0,0 +1,53 @@
+# 在页面中执行：按 XPath 找出列表中的卡片，跳过之前已经返回过的卡片，
+# 只返回新出现卡片的名称和链接。已返回的卡片节点记在页面里的 WeakSet 中，
+# 因此每次滚动只需要一次 evaluate 往返，且只传回新增的卡片。
+DISCOVER_SCRIPT = '''
+({cardXPath, nameXPath, linkXPath, stateKey}) => {
+    const state = window[stateKey] || (window[stateKey] = {nodes: new WeakSet(), names: new Set()});
+    const first = (xpath, context) =>
+        document.evaluate(xpath, context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    const cards = document.evaluate(cardXPath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const found = [];
+    for (let i = 0; i < cards.snapshotLength; i++) {
+        const card = cards.snapshotItem(i);
+        if (state.nodes.has(card)) continue;
+        const nameNode = first(nameXPath, card);
+        const name = nameNode ? nameNode.innerText.trim() : '';
+        // 名称还没渲染出来的卡片留到下一次
+        if (!name) continue;
+        state.nodes.add(card);
+        if (state.names.has(name)) continue;
+        state.names.add(name);
+        const link = first(linkXPath, card);
+        const href = link && link.href && !link.href.startsWith('javascript') ? link.href : null;
+        found.push([name, href]);
+    }
+    return found;
+}
+'''
+
+
+class ListingDiscovery:
+    """增量发现列表页上的卡片，返回 [(名称, 链接绝对地址或 None)]
+
+    name_xpath 和 link_xpath 相对于卡片节点，应以 '.' 开头。页面重新打开后页面内的记录随之清空，
+    调用方自己按名称去重即可。
+    """
+
+    def __init__(self, card_xpath, name_xpath, link_xpath, state_key='__spiderDiscovery'):
+        self.args = {'cardXPath': card_xpath, 'nameXPath': name_xpath, 'linkXPath': link_xpath,
+                     'stateKey': state_key}
+
+    def discover(self, page):
+        return [(name, href) for name, href in page.evaluate(DISCOVER_SCRIPT, self.args)]
+
+
+# 懂车帝车型库中的车辆卡片：车名和参数页链接
+LIBRARY_DISCOVERY = ListingDiscovery('//div[contains(@class,"car-list_card")]',
+                                     './/a[contains(@class,"card_name")]',
+                                     './/a[contains(text(),"参数")]')
+
+# 汽车之家价格页中的车型卡片：车名链接同时也是车系页地址
+PRICE_DISCOVERY = ListingDiscovery('//li[contains(@class,"group")]',
+                                   './/a[contains(@class,"text")]',
+                                   './/a[contains(@class,"text")]')
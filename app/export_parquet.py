@@ -0,0 +1,172 @@
+import os
+import argparse
+from pathlib import Path
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from csv_store import read_header
+from dcd_schema import TYPED_COLUMNS
+from sqlite_dcd import parse_csv_file as parse_dcd_csv
+from import_pipeline import parallel_parse
+
+# Parquet 压缩算法，zstd 的压缩率和解压速度都较好
+PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'zstd')
+
+# SQLite 类型到 Arrow 类型的映射，用于懂车帝车型表的强类型列
+ARROW_TYPES = {'REAL': pa.float64(), 'TEXT': pa.string(), 'INTEGER': pa.int32()}
+
+DCD_TRIM_SCHEMA = pa.schema(
+    [('trim', pa.string())] + [(name, ARROW_TYPES[sql_type]) for name, sql_type in TYPED_COLUMNS.items()])
+DCD_PARAM_SCHEMA = pa.schema([
+    ('trim', pa.string()),
+    ('attribute', pa.string()),
+    ('value', pa.string()),
+    ('value_num', pa.float64()),
+])
+
+# 评价表中固定在最前面的列，其余列（各评价标题及其评分）按名称排序
+AUTOHOME_BASE_COLUMNS = ['评价ID', '车名', '用户ID']
+
+
+def partition_path(dataset_dir, key, value):
+    """返回 Hive 风格的分区文件路径，分区值按 URI 编码，pyarrow 读取时会自动解码"""
+    return Path(dataset_dir) / f'{key}={quote(value, safe="")}' / 'part-0.parquet'
+
+
+def is_up_to_date(source, targets):
+    """所有导出文件都比源文件新时跳过导出"""
+    source_mtime = Path(source).stat().st_mtime
+    return all(target.exists() and target.stat().st_mtime >= source_mtime for target in targets)
+
+
+def write_partition(table, target):
+    """先写入临时文件再替换，中断时不会留下半个 Parquet 文件"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = target.with_suffix('.tmp')
+    pq.write_table(table, temp_path, compression=PARQUET_COMPRESSION)
+    os.replace(temp_path, target)
+
+
+def dcd_tables(parsed):
+    """将 sqlite_dcd 的解析结果转换为车型表和参数长表"""
+    trims = {name: [] for name in DCD_TRIM_SCHEMA.names}
+    params = {name: [] for name in DCD_PARAM_SCHEMA.names}
+    attribute_names = parsed['attribute_names']
+    for trim_name, typed, values in parsed['trims']:
+        trims['trim'].append(trim_name)
+        for name, value in zip(TYPED_COLUMNS, typed):
+            trims[name].append(value)
+        for index, value, value_num in values:
+            params['trim'].append(trim_name)
+            params['attribute'].append(attribute_names[index])
+            params['value'].append(value)
+            params['value_num'].append(value_num)
+    return (pa.Table.from_pydict(trims, schema=DCD_TRIM_SCHEMA),
+            pa.Table.from_pydict(params, schema=DCD_PARAM_SCHEMA))
+
+
+def export_dcd(data_dir, output_dir, force=False):
+    """导出懂车帝参数：dcd/trims 为带强类型列的车型表，dcd/params 为参数长表，均按车系分区"""
+    trims_dir = Path(output_dir) / 'dcd' / 'trims'
+    params_dir = Path(output_dir) / 'dcd' / 'params'
+
+    csv_files = sorted(Path(data_dir).glob('*_参数.csv'))
+    changed = {}
+    for csv_file_path in csv_files:
+        series = csv_file_path.stem[:-len('_参数')]
+        targets = (partition_path(trims_dir, 'series', series), partition_path(params_dir, 'series', series))
+        if force or not is_up_to_date(csv_file_path, targets):
+            changed[csv_file_path] = targets
+
+    exported = 0
+    for csv_file_path, parsed, error in parallel_parse(changed, parse_dcd_csv):
+        if error:
+            print(f"解析 {csv_file_path.name} 时出错: {error}")
+            continue
+        if parsed is None:
+            continue
+        trims_table, params_table = dcd_tables(parsed)
+        trims_target, params_target = changed[csv_file_path]
+        write_partition(trims_table, trims_target)
+        write_partition(params_table, params_target)
+        exported += 1
+    print(f"懂车帝: 导出 {exported} 个车系，跳过 {len(csv_files) - len(changed)} 个未变化的车系")
+
+
+def autohome_schema(csv_files):
+    """合并所有评价CSV的表头得到统一的表结构，评分列为数值，其余为文本"""
+    columns = set()
+    for csv_file_path in csv_files:
+        columns.update(read_header(csv_file_path) or [])
+    columns.discard('车名')  # 车名作为分区列
+    ordered = [name for name in AUTOHOME_BASE_COLUMNS if name in columns]
+    ordered += sorted(columns - set(ordered))
+    return pa.schema([(name, pa.float32() if name.endswith('评分') else pa.string()) for name in ordered])
+
+
+def read_reviews(args):
+    """在子进程中读取单个评价CSV并转换为统一的表结构"""
+    csv_file_path, schema = args
+    df = pd.read_csv(csv_file_path, on_bad_lines='skip', dtype=str)
+    df = df.reindex(columns=schema.names)
+    for name in schema.names:
+        if pa.types.is_floating(schema.field(name).type):
+            # '无评分' 等非数值内容转为空值
+            df[name] = pd.to_numeric(df[name], errors='coerce')
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def export_autohome(data_dir, output_dir, force=False):
+    """导出汽车之家评价到 autohome/reviews，按车名分区，各车型的列统一为同一结构"""
+    reviews_dir = Path(output_dir) / 'autohome' / 'reviews'
+    csv_files = sorted(Path(data_dir).glob('*_评价.csv'))
+    if not csv_files:
+        print("汽车之家: 没有找到评价CSV")
+        return
+
+    schema = autohome_schema(csv_files)
+    schema_file = reviews_dir / '_schema.txt'
+    # 表结构变化（出现新的评价标题）时全部重新导出，保证各分区的列一致
+    schema_text = schema.to_string()
+    if schema_file.exists() and schema_file.read_text(encoding='utf-8') != schema_text:
+        force = True
+
+    changed = {}
+    for csv_file_path in csv_files:
+        target = partition_path(reviews_dir, 'car', csv_file_path.stem[:-len('_评价')])
+        if force or not is_up_to_date(csv_file_path, [target]):
+            changed[(csv_file_path, schema)] = target
+
+    exported = 0
+    for task, table, error in parallel_parse(changed, read_reviews):
+        if error:
+            print(f"读取 {task[0].name} 时出错: {error}")
+            continue
+        write_partition(table, changed[task])
+        exported += 1
+
+    reviews_dir.mkdir(parents=True, exist_ok=True)
+    schema_file.write_text(schema_text, encoding='utf-8')
+    print(f"汽车之家: 导出 {exported} 个车型，跳过 {len(csv_files) - len(changed)} 个未变化的车型，共 {len(schema)} 列")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='将爬取的CSV导出为按站点和车系分区的 Parquet 数据集')
+    parser.add_argument('--site', choices=['dcd', 'autohome', 'all'], default='all')
+    parser.add_argument('--dcd-dir', default='dcd_data')
+    parser.add_argument('--autohome-dir', default='autohome_reviews')
+    parser.add_argument('--output', default='export')
+    parser.add_argument('--force', action='store_true', help='忽略修改时间，全部重新导出')
+    args = parser.parse_args()
+
+    if args.site in ('dcd', 'all'):
+        export_dcd(args.dcd_dir, args.output, args.force)
+    if args.site in ('autohome', 'all'):
+        export_autohome(args.autohome_dir, args.output, args.force)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import time
+import hashlib
+from pathlib import Path
+
+
+def ensure_manifest(conn):
+    """创建导入清单表，返回该表是否为新建"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='import_manifest'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_manifest (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            content_hash TEXT NOT NULL,
+            rows_loaded INTEGER NOT NULL,
+            loaded_at REAL NOT NULL
+        )
+    ''')
+    conn.commit()
+    return not exists
+
+
+def file_hash(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_file(conn, key, file_path):
+    """对比清单判断文件状态，返回 (状态, 文件信息)
+
+    状态为 'new'、'changed' 或 'unchanged'。大小和修改时间都没变时直接视为未变化，
+    不读取文件内容；只有它们变化时才计算哈希确认内容是否真的改变。
+    """
+    stat = Path(file_path).stat()
+    info = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    row = conn.execute('SELECT size, mtime, content_hash FROM import_manifest WHERE path=?', (key,)).fetchone()
+    if row and row[0] == info['size'] and row[1] == info['mtime']:
+        return 'unchanged', info
+
+    info['content_hash'] = file_hash(file_path)
+    if row is None:
+        return 'new', info
+    if row[2] == info['content_hash']:
+        # 内容没变（例如只是被 touch 过），更新修改时间，下次不用再算哈希
+        conn.execute('UPDATE import_manifest SET size=?, mtime=? WHERE path=?', (info['size'], info['mtime'], key))
+        conn.commit()
+        return 'unchanged', info
+    return 'changed', info
+
+
+def record_file(conn, key, info, rows_loaded):
+    """记录文件已导入，应与数据写入在同一个事务中调用"""
+    conn.execute(
+        'INSERT OR REPLACE INTO import_manifest (path, size, mtime, content_hash, rows_loaded, loaded_at) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        (key, info['size'], info['mtime'], info['content_hash'], rows_loaded, time.time()))
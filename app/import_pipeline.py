@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# 解析CSV的进程数，默认使用全部CPU
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', os.cpu_count() or 1))
+
+
+def parallel_parse(tasks, parse_func, workers=IMPORT_WORKERS, max_pending=None, task_bytes=None, max_bytes=None):
+    """在进程池中解析文件，主进程作为唯一的写入者按完成顺序取回结果
+
+    同时在途（解析中或已解析未取走）的任务不超过 max_pending 个；给出 task_bytes(task)
+    和 max_bytes 时，在途任务的字节数之和也不超过 max_bytes（单个超过上限的任务仍会单独解析），
+    已解析的数据不会在内存中无限堆积。依次产出 (task, result, error)，解析失败时 result 为 None。
+    parse_func 必须是模块级函数，以便传给子进程。
+    """
+    max_pending = max_pending or workers * 2
+    tasks = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        in_flight = 0
+        waiting = []
+
+        def submit_next():
+            nonlocal in_flight
+            for task in waiting or tasks:
+                size = task_bytes(task) if task_bytes else 0
+                if pending and max_bytes and in_flight + size > max_bytes:
+                    # 等已提交的任务取走后再提交
+                    waiting[:] = [task]
+                    return False
+                waiting.clear()
+                pending[executor.submit(parse_func, task)] = (task, size)
+                in_flight += size
+                return True
+            return False
+
+        def fill():
+            while len(pending) < max_pending and submit_next():
+                pass
+
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task, size = pending.pop(future)
+                error = future.exception()
+                yield task, (None if error else future.result()), error
+                in_flight -= size
+                fill()
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from collections import defaultdict
+
+# 运行过程中定期导出指标文件的间隔（秒）
+EXPORT_SECONDS = float(os.environ.get('METRICS_EXPORT_SECONDS', 60))
+
+# 各阶段耗时直方图的桶上限（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def failure_cause(error):
+    """把异常归类为失败原因，用于按原因统计"""
+    name = type(error).__name__
+    message = str(error)
+    if name == 'BlockedError':
+        return 'blocked'
+    if 'Timeout' in name:
+        return 'timeout'
+    if 'closed' in message.lower() or 'crash' in message.lower() or '浏览器重启' in message:
+        return 'browser'
+    if name in ('ConnectionError', 'HTTPError', 'ReadTimeout', 'ChunkedEncodingError', 'SSLError'):
+        return 'network'
+    if isinstance(error, (ValueError, KeyError, IndexError, TypeError, AttributeError)):
+        return 'parse'
+    if isinstance(error, OSError):
+        return 'io'
+    return 'other'
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(BUCKETS) if value <= bound), len(BUCKETS))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """按桶估算分位数，返回该分位所在桶的上限"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return BUCKETS[index] if index < len(BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': round(self.sum, 6), 'max': round(self.max, 6),
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95),
+                'buckets': {str(bound): count for bound, count in zip(BUCKETS + ('+Inf',), self.counts)}}
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def describe(entry):
+    labels = ', '.join(f'{key}={value}' for key, value in entry['labels'].items())
+    return f"{entry['name']}[{labels}]" if labels else entry['name']
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Metrics:
+    """进程内的指标：计数器、仪表和各阶段耗时直方图，线程安全
+
+    导出为 JSON 和 Prometheus 文本格式（可以交给 node_exporter 的 textfile collector 采集）。
+    """
+
+    def __init__(self, prefix='spider'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.histograms = defaultdict(Histogram)
+        self.started = time.time()
+        self.last_export = time.monotonic()
+        # 导出目录由爬虫在启动时设置；collectors 在导出时把其他组件的统计记为仪表
+        self.directory = None
+        self.collectors = []
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock:
+            self.counters[(name, label_key(labels))] += amount
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            self.histograms[(name, label_key(labels))].observe(value)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """记录代码块耗时到 stage_seconds{stage=...}，出错时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+    def collect(self, name, summary, label=None):
+        """注册在导出时调用的 summary()，例如浏览器池、请求路由和限速器
+
+        summary() 返回 {统计项: 数值}；传入 label 时返回 {标签值: {统计项: 数值}}，例如限速器按域名的统计。
+        """
+        self.collectors.append((name, summary, label))
+
+    def absorb(self, name, stats, **labels):
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.set_gauge(f'{name}_{key}', value, **labels)
+
+    def run_collectors(self):
+        for name, summary, label in self.collectors:
+            stats = summary()
+            if label:
+                for value, nested in stats.items():
+                    self.absorb(name, nested, **{label: value})
+            else:
+                self.absorb(name, stats)
+
+    def failure(self, error, **labels):
+        self.inc('failures_total', cause=failure_cause(error), **labels)
+
+    def pages_per_minute(self):
+        elapsed = max(time.time() - self.started, 1e-9) / 60
+        pages = sum(value for (name, _), value in self.counters.items() if name == 'pages_total')
+        return pages / elapsed
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'started_at': self.started,
+                'elapsed_seconds': round(time.time() - self.started, 3),
+                'pages_per_minute': round(self.pages_per_minute(), 3),
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'gauges': [{'name': name, 'labels': dict(labels), 'value': value}
+                           for (name, labels), value in sorted(self.gauges.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), **histogram.to_dict()}
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            lines.append(f'{self.prefix}_pages_per_minute {self.pages_per_minute():.3f}')
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'{self.prefix}_{name}{format_labels(labels)} {value:g}')
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(f'{self.prefix}_{name}{format_labels(labels)} {value:g}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = f'{self.prefix}_{name}'
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{metric}_sum{format_labels(labels)} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, directory=None):
+        """写出 metrics.json 和 metrics.prom，先写临时文件再替换，采集端不会读到半个文件"""
+        directory = Path(directory or self.directory)
+        self.run_collectors()
+        directory.mkdir(parents=True, exist_ok=True)
+        for file_name, content in (('metrics.json', json.dumps(self.snapshot(), ensure_ascii=False, indent=2)),
+                                   ('metrics.prom', self.prometheus_text())):
+            temp_path = directory / f'{file_name}.tmp'
+            temp_path.write_text(content, encoding='utf-8')
+            os.replace(temp_path, directory / file_name)
+        self.last_export = time.monotonic()
+
+    def maybe_export(self):
+        """设置了导出目录且距离上次导出超过 EXPORT_SECONDS 时导出，在主循环中调用"""
+        if self.directory and time.monotonic() - self.last_export >= EXPORT_SECONDS:
+            self.export()
+
+    def summary_lines(self):
+        """报告中的指标摘要：吞吐、各阶段耗时和失败原因"""
+        snapshot = self.snapshot()
+        lines = [f"运行时长: {snapshot['elapsed_seconds'] / 60:.1f} 分钟, 吞吐: {snapshot['pages_per_minute']:.1f} 页/分钟"]
+        for entry in snapshot['counters'] + snapshot['gauges']:
+            lines.append(f"{describe(entry)}: {entry['value']:g}")
+        for histogram in snapshot['histograms']:
+            average = histogram['sum'] / histogram['count'] if histogram['count'] else 0
+            lines.append(f"{describe(histogram)}: {histogram['count']} 次, 平均 {average:.3f}s, "
+                         f"p50≤{histogram['p50']}s, p95≤{histogram['p95']}s, 最长 {histogram['max']:.3f}s")
+        return lines
+
+
+# 两个爬虫各自是一个进程，模块级实例即可
+METRICS = Metrics()
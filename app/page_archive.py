@@ -0,0 +1,273 @@
+import os
+import re
+import csv
+import gzip
+import filecmp
+import json
+import time
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from collections import Counter, defaultdict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from csv_store import read_header
+from dcd_parser import parse_param_table
+from dcd_api import extract_raw_data, build_param_table
+from autohome_parser import parse_review_page
+from import_pipeline import parallel_parse, IMPORT_WORKERS
+
+# 设为 1 时保存抓取到的原始页面，解析逻辑修改后可以离线重新解析，不用重新抓取
+ARCHIVE_ENABLED = os.environ.get('PAGE_ARCHIVE', '0') == '1'
+# 压缩算法：安装了 zstandard 时默认 zstd，否则 gzip
+ARCHIVE_COMPRESSION = os.environ.get('PAGE_ARCHIVE_COMPRESSION', 'zstd' if zstandard else 'gzip')
+
+EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+
+
+def compress(data, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data, path):
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise RuntimeError(f'{path} 使用 zstd 压缩，需要安装 zstandard')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class PageArchive:
+    """按内容哈希去重的原始页面存档
+
+    页面压缩后保存在 objects/<哈希前两位>/<哈希>.html.<gz|zst>，内容相同的页面只保存一份；
+    每次保存在 index.jsonl 中追加一行 {kind, key, url, hash, file, archived_at, ...}，
+    同一 (kind, key) 以最后一行为准。写入线程安全，直接请求的工作线程也可以调用。
+    """
+
+    def __init__(self, directory, compression=ARCHIVE_COMPRESSION):
+        if compression not in EXTENSIONS:
+            raise ValueError(f'不支持的压缩算法: {compression}')
+        if compression == 'zstd' and zstandard is None:
+            raise RuntimeError('使用 zstd 压缩需要安装 zstandard，或设置 PAGE_ARCHIVE_COMPRESSION=gzip')
+        self.directory = Path(directory)
+        self.compression = compression
+        self.index_path = self.directory / 'index.jsonl'
+        (self.directory / 'objects').mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.index_file = None
+        self.stats = Counter()
+
+    def find_object(self, content_hash):
+        """已保存的对象路径，之前的运行可能用了另一种压缩算法"""
+        base = self.directory / 'objects' / content_hash[:2] / f'{content_hash}.html'
+        for extension in EXTENSIONS.values():
+            path = base.with_name(base.name + extension)
+            if path.exists():
+                return path
+        return None
+
+    def save(self, kind, key, url, content, **meta):
+        """保存一个页面，返回内容哈希；meta 中的字段一并写入索引，供重新解析时使用"""
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        content_hash = hashlib.sha256(data).hexdigest()
+        # 压缩在锁外进行，多个请求线程可以同时压缩
+        compressed = None if self.find_object(content_hash) else compress(data, self.compression)
+        with self.lock:
+            path = self.find_object(content_hash)
+            if path is None:
+                path = self.directory / 'objects' / content_hash[:2] / \
+                    f'{content_hash}.html{EXTENSIONS[self.compression]}'
+                path.parent.mkdir(exist_ok=True)
+                compressed = compressed or compress(data, self.compression)
+                temp_path = path.with_name(path.name + '.tmp')
+                temp_path.write_bytes(compressed)
+                os.replace(temp_path, path)
+                self.stats['stored'] += 1
+                self.stats['raw_bytes'] += len(data)
+                self.stats['stored_bytes'] += len(compressed)
+            else:
+                self.stats['deduplicated'] += 1
+
+            if self.index_file is None:
+                self.index_file = open(self.index_path, 'a', encoding='utf-8')
+            entry = {'kind': kind, 'key': key, 'url': url, 'hash': content_hash,
+                     'file': path.relative_to(self.directory).as_posix(), 'archived_at': time.time(), **meta}
+            self.index_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.index_file.flush()
+        return content_hash
+
+    def latest(self, kind=None):
+        """索引中每个 (kind, key) 最后保存的记录，按首次出现的顺序返回"""
+        entries = {}
+        if self.index_path.exists():
+            with open(self.index_path, encoding='utf-8') as index_file:
+                for line in index_file:
+                    # 进程被杀掉时最后一行可能不完整
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if kind is None or entry['kind'] == kind:
+                        entries[(entry['kind'], entry['key'])] = entry
+        return list(entries.values())
+
+    def summary(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def log_summary(self, logger):
+        stats = self.summary()
+        logger.info(f"页面存档: 新保存 {stats.get('stored', 0)} 个, 重复 {stats.get('deduplicated', 0)} 个, "
+                    f"压缩前 {stats.get('raw_bytes', 0) / 1024 / 1024:.1f} MB, "
+                    f"压缩后 {stats.get('stored_bytes', 0) / 1024 / 1024:.1f} MB")
+
+    def close(self):
+        with self.lock:
+            if self.index_file:
+                self.index_file.close()
+                self.index_file = None
+
+
+def load_page(archive_dir, entry):
+    path = Path(archive_dir) / entry['file']
+    return decompress(path.read_bytes(), path).decode('utf-8')
+
+
+def reparse_param_page(task):
+    """进程池任务：重新解析一个参数页，按保存时的格式选择解析器"""
+    archive_dir, entry = task
+    content = load_page(archive_dir, entry)
+    if entry.get('format') == 'next_data':
+        return build_param_table(extract_raw_data(content))
+    return parse_param_table(content)
+
+
+def reparse_car_reviews(task):
+    """进程池任务：重新解析一个车型的全部评价页，返回 {评价ID: 行}"""
+    archive_dir, entries = task
+    rows = {}
+    for entry in entries:
+        review_data = parse_review_page(load_page(archive_dir, entry))
+        if review_data is not None:
+            rows[entry['key']] = {'评价ID': entry['key'], **review_data}
+    return rows
+
+
+def sanitize_filename(filename):
+    return re.sub(r'[\\/*?:"<>|]', '_', filename)
+
+
+def write_if_changed(file_path, text):
+    """内容不同时才写入，未变化的文件保持原来的修改时间，导入数据库时会被跳过"""
+    data = text.encode('utf-8')
+    if file_path.exists() and file_path.read_bytes() == data:
+        return False
+    temp_path = file_path.with_name(file_path.name + '.tmp')
+    temp_path.write_bytes(data)
+    os.replace(temp_path, file_path)
+    return True
+
+
+def merge_reviews(csv_file_path, reviews):
+    """用重新解析的评价替换 CSV 中评价ID相同的行，存档中有而 CSV 中没有的评价追加在末尾
+
+    存档只覆盖开启之后抓取的评价，其余行原样保留。返回 (替换数, 追加数)，
+    旧版没有评价ID列的文件无法对应，返回 None。
+    """
+    reviews = dict(reviews)
+    fieldnames = read_header(csv_file_path) if csv_file_path.exists() else []
+    if fieldnames and '评价ID' not in fieldnames:
+        return None
+    known = set(fieldnames)
+    for row in reviews.values():
+        for column in row:
+            if column not in known:
+                known.add(column)
+                fieldnames.append(column)
+
+    replaced = 0
+    temp_path = csv_file_path.with_name(csv_file_path.name + '.tmp')
+    with open(temp_path, 'w', newline='', encoding='utf-8') as dst:
+        writer = csv.DictWriter(dst, fieldnames=fieldnames, restval='', extrasaction='ignore')
+        writer.writeheader()
+        if csv_file_path.exists():
+            with open(csv_file_path, 'r', newline='', encoding='utf-8') as src:
+                for row in csv.DictReader(src):
+                    if row['评价ID'] in reviews:
+                        row = reviews.pop(row['评价ID'])
+                        replaced += 1
+                    writer.writerow(row)
+        writer.writerows(reviews.values())
+    # 内容没有变化时保留原文件，导入数据库时会被跳过
+    if csv_file_path.exists() and filecmp.cmp(temp_path, csv_file_path, shallow=False):
+        temp_path.unlink()
+    else:
+        os.replace(temp_path, csv_file_path)
+    return replaced, len(reviews)
+
+
+def reparse_dcd(data_dir, workers):
+    archive = PageArchive(Path(data_dir) / 'archive')
+    entries = archive.latest('dcd_params')
+    tasks = ((str(archive.directory), entry) for entry in entries)
+    counts = Counter()
+    for (_, entry), table, error in parallel_parse(tasks, reparse_param_page, workers):
+        if error or table is None:
+            print(f"重新解析 {entry['key']} 失败: {error or '页面中没有参数数据'}")
+            counts['failed'] += 1
+            continue
+        csv_file_path = Path(data_dir) / sanitize_filename(f"{entry['key']}_参数.csv")
+        counts['changed' if write_if_changed(csv_file_path, table.csv_text()) else 'unchanged'] += 1
+    print(f"懂车帝: 存档中 {len(entries)} 个车型，重写 {counts['changed']} 个，未变化 {counts['unchanged']} 个，"
+          f"失败 {counts['failed']} 个")
+
+
+def reparse_autohome(data_dir, workers):
+    archive = PageArchive(Path(data_dir) / 'archive')
+    by_car = defaultdict(list)
+    for entry in archive.latest('autohome_review'):
+        by_car[entry['car']].append(entry)
+    tasks = ((str(archive.directory), entries) for entries in by_car.values())
+    counts = Counter()
+    for (_, entries), rows, error in parallel_parse(tasks, reparse_car_reviews, workers, max_pending=workers):
+        car_name = entries[0]['car']
+        if error:
+            print(f"重新解析 {car_name} 的评价失败: {error}")
+            counts['failed'] += 1
+            continue
+        merged = merge_reviews(Path(data_dir) / f'{car_name}_评价.csv', rows)
+        if merged is None:
+            print(f"{car_name}_评价.csv 没有评价ID列，无法与存档对应，已跳过")
+            counts['skipped'] += 1
+            continue
+        counts['replaced'] += merged[0]
+        counts['added'] += merged[1]
+    print(f"汽车之家: 存档中 {len(by_car)} 个车型，替换 {counts['replaced']} 条评价，追加 {counts['added']} 条，"
+          f"跳过 {counts['skipped']} 个车型，失败 {counts['failed']} 个车型")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='用存档的原始页面离线重新解析，重新生成各车型的CSV')
+    parser.add_argument('--site', choices=['dcd', 'autohome', 'all'], default='all')
+    parser.add_argument('--dcd-dir', default='dcd_data')
+    parser.add_argument('--autohome-dir', default='autohome_reviews')
+    parser.add_argument('--workers', type=int, default=IMPORT_WORKERS)
+    args = parser.parse_args()
+
+    if args.site in ('dcd', 'all'):
+        reparse_dcd(args.dcd_dir, args.workers)
+    if args.site in ('autohome', 'all'):
+        reparse_autohome(args.autohome_dir, args.workers)
+    print("CSV 已更新，运行 sqlite_dcd.py / sqlite_autohome.py 只会重新导入内容变化的文件")
+
+
+if __name__ == '__main__':
+    main()
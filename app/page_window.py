@@ -0,0 +1,127 @@
+import time
+from collections import Counter, deque
+from urllib.parse import urlsplit
+from rate_limit import page_blocked
+from metrics import METRICS
+
+# 同一任务最多因浏览器崩溃重新排队的次数，避免某个页面反复让浏览器崩溃
+MAX_REQUEUE = 2
+
+
+class PageWindow:
+    """同时打开多个页面，按提交顺序逐个取回处理
+
+    页面通过 goto(wait_until='commit') 打开后立即返回，浏览器会在后台并行加载，
+    主线程只在处理窗口中最早的页面时阻塞，因此同步 API 下也能同时加载 size 个页面。
+    页面从 BrowserPool 借出，处理完归还复用。domain_limit 限制同一域名下同时加载的页面数。
+    浏览器崩溃时，窗口中所有以 URL 打开的任务放回队列，重启浏览器后继续处理。
+    传入 limiter 时，导航前按域名取令牌，处理结果（耗时、失败、被反爬拦截）反馈给限速器。
+    没有令牌的任务留在队列中，窗口中有页面时先处理它们；窗口为空时用 BrowserPool.wait 等待令牌，
+    不用 time.sleep 阻塞 Playwright 线程。
+    """
+
+    def __init__(self, pool, size, domain_limit=None, limiter=None):
+        self.pool = pool
+        self.limiter = limiter
+        self.size = max(1, int(size))
+        self.domain_limit = domain_limit
+        self.in_flight = deque()
+        self.domains = Counter()
+        self.requeued = Counter()
+
+    def __len__(self):
+        return len(self.in_flight)
+
+    def full(self):
+        return len(self.in_flight) >= self.size
+
+    def domain_available(self, domain):
+        return not self.domain_limit or self.domains[domain] < self.domain_limit
+
+    def open(self, key, target, domain=None):
+        """target 为 URL 时借一个页面导航；为函数时调用它得到新页面（例如点击链接打开）"""
+        if callable(target):
+            page = target()
+        else:
+            page = self.pool.acquire_page()
+            try:
+                with METRICS.timer('navigate'):
+                    page.goto(target, wait_until='commit')
+            except Exception:
+                self.pool.release_page(page, reuse=False)
+                raise
+        self.domains[domain] += 1
+        self.in_flight.append((key, target, page, domain, time.perf_counter()))
+
+    def fill(self, queue, on_error):
+        """从队列中取任务填满窗口，域名已达上限或暂时没有令牌的任务留在队列中等待
+
+        返回没有令牌的任务中最短的等待秒数，没有这类任务时返回 0。
+        """
+        waiting = deque()
+        token_waits = {}
+        while queue and not self.full():
+            key, target = queue.popleft()
+            domain = None if callable(target) else urlsplit(target).hostname
+            if not self.domain_available(domain) or domain in token_waits:
+                waiting.append((key, target))
+                continue
+            if self.limiter and not callable(target):
+                wait = self.limiter.try_acquire(domain)
+                if wait:
+                    token_waits[domain] = wait
+                    waiting.append((key, target))
+                    continue
+            try:
+                self.open(key, target, domain)
+            except Exception as e:
+                if not self.recover(queue, [(key, target)], on_error):
+                    on_error(key, e)
+        queue.extendleft(reversed(waiting))
+        return min(token_waits.values(), default=0)
+
+    def recover(self, queue, failed, on_error):
+        """浏览器崩溃时重启，把失败的任务和窗口中的任务放回队列头部；浏览器正常时返回 False"""
+        if not self.pool.crashed():
+            return False
+        tasks = list(failed) + [(key, target) for key, target, _, _, _ in self.in_flight]
+        self.in_flight.clear()
+        self.domains.clear()
+        self.pool.restart_if_crashed()
+        requeue = []
+        for key, target in tasks:
+            if callable(target):
+                # 点击打开的任务依赖原页面上的元素，浏览器重启后无法重做
+                on_error(key, RuntimeError('浏览器重启，点击打开的页面无法重新打开'))
+            elif self.requeued[key] >= MAX_REQUEUE:
+                on_error(key, RuntimeError(f'浏览器重启 {self.requeued[key]} 次后仍未完成'))
+            else:
+                self.requeued[key] += 1
+                requeue.append((key, target))
+        queue.extendleft(reversed(requeue))
+        return True
+
+    def process(self, queue, handle, on_error):
+        """从队列中取 (key, URL 或打开页面的函数) 填满窗口，按顺序调用 handle(key, page)，处理后归还页面"""
+        while queue or self.in_flight:
+            wait = self.fill(queue, on_error)
+
+            if not self.in_flight:
+                if wait:
+                    self.pool.wait(wait)
+                continue
+
+            key, target, page, domain, started = self.in_flight.popleft()
+            self.domains[domain] -= 1
+            try:
+                handle(key, page)
+            except Exception as e:
+                if self.limiter and not self.pool.crashed():
+                    self.limiter.record(domain, time.perf_counter() - started, ok=False, blocked=page_blocked(page))
+                self.pool.release_page(page, reuse=False)
+                if not self.recover(queue, [(key, target)], on_error):
+                    on_error(key, e)
+            else:
+                if self.limiter:
+                    self.limiter.record(domain, time.perf_counter() - started)
+                self.pool.release_page(page)
@@ -0,0 +1,196 @@
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+# 每个域名的初始、最低和最高请求速率（次/秒）
+RATE_START = float(os.environ.get('RATE_LIMIT_START', 2))
+RATE_MIN = float(os.environ.get('RATE_LIMIT_MIN', 0.2))
+RATE_MAX = float(os.environ.get('RATE_LIMIT_MAX', 8))
+# 响应耗时超过该值（秒）时视为服务端吃紧，开始降速
+TARGET_LATENCY = float(os.environ.get('RATE_LIMIT_TARGET_LATENCY', 5))
+# 遇到验证码或反爬页面后，该域名暂停请求的秒数
+BLOCK_COOLDOWN = float(os.environ.get('RATE_LIMIT_BLOCK_COOLDOWN', 120))
+
+# 失败任务的最大重试次数和退避时间（秒）
+RETRY_ATTEMPTS = int(os.environ.get('RETRY_ATTEMPTS', 3))
+RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', 5))
+RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', 300))
+
+# 反爬拦截的特征：状态码、跳转地址和页面文字
+BLOCK_STATUS = {403, 429}
+BLOCK_URL_MARKERS = ('captcha', 'verify', 'antispider', 'security')
+BLOCK_TEXT_MARKERS = ('验证码', '安全验证', '滑动验证', '人机验证', '访问过于频繁', '请求过于频繁')
+
+
+def domain_of(url):
+    return urlsplit(url).hostname if url else None
+
+
+def detect_block(status=None, url='', text=''):
+    """根据状态码、最终地址和页面文字判断请求是否被验证码或反爬拦截"""
+    if status in BLOCK_STATUS:
+        return True
+    lowered = (url or '').lower()
+    if any(marker in lowered for marker in BLOCK_URL_MARKERS):
+        return True
+    return any(marker in (text or '') for marker in BLOCK_TEXT_MARKERS)
+
+
+def page_blocked(page):
+    """浏览器页面是否停在验证码或反爬页面上"""
+    try:
+        return detect_block(url=page.url, text=page.title())
+    except Exception:
+        return False
+
+
+class BlockedError(Exception):
+    """请求被验证码或反爬页面拦截"""
+
+
+class DomainBucket:
+    """单个域名的令牌桶，容量为一秒的请求量"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.stats = Counter()
+
+    def refill(self, now):
+        capacity = max(1.0, self.rate)
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class AdaptiveRateLimiter:
+    """按域名限速的令牌桶，速率随请求结果自适应调整，线程安全
+
+    - 成功且响应不慢时速率线性增加，逐步逼近服务端能承受的上限；
+    - 失败时速率乘以 0.7，响应变慢时乘以 0.9；
+    - 检测到验证码或反爬页面时速率减半，并暂停该域名 BLOCK_COOLDOWN 秒。
+    """
+
+    def __init__(self, rate=RATE_START, min_rate=RATE_MIN, max_rate=RATE_MAX,
+                 target_latency=TARGET_LATENCY, block_cooldown=BLOCK_COOLDOWN):
+        self.start_rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.block_cooldown = block_cooldown
+        self.step = max(0.05, (max_rate - min_rate) / 50)
+        self.lock = threading.Lock()
+        self.buckets = defaultdict(lambda: DomainBucket(self.start_rate))
+
+    def try_acquire(self, domain):
+        """不等待地取一个令牌：取到时返回 0，否则返回还需等待的秒数"""
+        if not domain:
+            return 0
+        with self.lock:
+            bucket = self.buckets[domain]
+            now = time.monotonic()
+            bucket.refill(now)
+            if now < bucket.paused_until:
+                return bucket.paused_until - now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                bucket.stats['requests'] += 1
+                return 0
+            return (1 - bucket.tokens) / bucket.rate
+
+    def acquire(self, domain, sleep=time.sleep):
+        """阻塞直到该域名有可用的令牌
+
+        在 Playwright 同步 API 的线程上调用时传入 BrowserPool.wait：time.sleep 会让该线程上
+        所有页面的路由回调一起停下，wait_for_timeout 等待期间事件循环照常运行。
+        """
+        while True:
+            wait = self.try_acquire(domain)
+            if not wait:
+                return
+            with self.lock:
+                self.buckets[domain].stats['wait_seconds'] += wait
+            sleep(wait)
+
+    def record(self, domain, latency=None, ok=True, blocked=False):
+        """记录一次请求的结果并调整该域名的速率"""
+        if not domain:
+            return
+        with self.lock:
+            bucket = self.buckets[domain]
+            if blocked:
+                bucket.rate = max(self.min_rate, bucket.rate * 0.5)
+                bucket.paused_until = time.monotonic() + self.block_cooldown
+                bucket.stats['blocked'] += 1
+            elif not ok:
+                bucket.rate = max(self.min_rate, bucket.rate * 0.7)
+                bucket.stats['errors'] += 1
+            elif latency is not None and latency > self.target_latency:
+                bucket.rate = max(self.min_rate, bucket.rate * 0.9)
+            else:
+                bucket.rate = min(self.max_rate, bucket.rate + self.step)
+
+    def summary(self):
+        with self.lock:
+            return {domain: {'rate': round(bucket.rate, 2), **bucket.stats} for domain, bucket in self.buckets.items()}
+
+    def log_summary(self, logger):
+        for domain, stats in self.summary().items():
+            logger.info(f"限速 [{domain}]: 当前 {stats['rate']} 次/秒, 请求 {stats.get('requests', 0)} 次, "
+                        f"失败 {stats.get('errors', 0)} 次, 被拦截 {stats.get('blocked', 0)} 次, "
+                        f"累计等待 {stats.get('wait_seconds', 0):.1f} 秒")
+
+
+class RetryQueue:
+    """失败任务的重试队列，按指数退避并加随机抖动安排下一次尝试
+
+    add() 在超过最大重试次数时返回 False，由调用方记为最终失败。
+    """
+
+    def __init__(self, max_attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.heap = []
+        self.order = itertools.count()
+        self.attempts = Counter()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, key, target, blocked=False):
+        """安排重试，被反爬拦截的任务多等一倍时间"""
+        self.attempts[key] += 1
+        attempt = self.attempts[key]
+        if attempt > self.max_attempts:
+            return False
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1) * (2 if blocked else 1))
+        delay = random.uniform(delay / 2, delay)
+        heapq.heappush(self.heap, (time.monotonic() + delay, next(self.order), key, target))
+        return True
+
+    def pop_due(self):
+        """取出所有已到重试时间的 (key, target)"""
+        now = time.monotonic()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, _, key, target = heapq.heappop(self.heap)
+            due.append((key, target))
+        return due
+
+    def drain(self, sleep=time.sleep):
+        """最后的重试轮次：等待下一批到期并逐批产出，处理中再次失败加入的任务也会被等待，直到队列为空
+
+        与 AdaptiveRateLimiter.acquire 相同，在 Playwright 线程上调用时传入 BrowserPool.wait。
+        """
+        while self.heap:
+            wait = self.heap[0][0] - time.monotonic()
+            if wait > 0:
+                sleep(wait)
+            yield self.pop_due()
@@ -0,0 +1,119 @@
+import os
+import time
+from collections import defaultdict
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from metrics import METRICS
+from rate_limit import page_blocked, BlockedError
+
+# 各站点的默认等待超时（毫秒）
+SITE_TIMEOUTS = {
+    'dcd': int(os.environ.get('DCD_READY_TIMEOUT', 20000)),
+    'autohome': int(os.environ.get('AUTOHOME_READY_TIMEOUT', 20000)),
+}
+# 可选标志元素在文档加载完成后再等待的时间（毫秒），超过后视为页面上没有该元素
+OPTIONAL_GRACE = int(os.environ.get('READY_OPTIONAL_GRACE', 3000))
+
+# 每类页面“可以开始解析”的标志元素
+READY_SELECTORS = {
+    'dcd': {
+        'library': '//div[contains(@class,"car-list_card")]',
+        'param': '//a[contains(@class,"cell_car")]',
+    },
+    'autohome': {
+        'price': '//li[contains(@class,"group")]',
+        'series': '//li/a[text()="口碑"]',
+        'koubei': '//a[contains(text(),"查看完整口碑")]',
+        'review': '//p[@class="kb-item-msg"]',
+    },
+}
+
+# 标志元素可能不存在的页面：没有车款的参数页、没有口碑标签的车系页、没有评价的口碑页。
+# 这些页面先等待文档加载完成，再短暂等待标志元素，仍然没有时视为不存在而不是超时
+OPTIONAL_MARKERS = {('dcd', 'param'), ('autohome', 'series'), ('autohome', 'koubei')}
+
+# (站点, 页面类型) -> [(耗时秒数, 是否就绪)]
+WAIT_STATS = defaultdict(list)
+
+
+def record_wait(site, kind, elapsed, ready):
+    WAIT_STATS[(site, kind)].append((elapsed, ready))
+    METRICS.observe('stage_seconds', elapsed, stage='ready_wait', kind=kind)
+    if not ready:
+        METRICS.inc('ready_timeouts_total', kind=kind)
+
+
+def wait_ready(page, site, kind, timeout=None):
+    """等待页面上出现该类页面的标志元素，返回标志元素是否存在，超时抛出 PlaywrightTimeoutError
+
+    可选标志元素的页面加载完成后仍没有该元素时返回 False；此时页面若是验证码或反爬页面，抛出 BlockedError。
+    """
+    timeout = timeout or SITE_TIMEOUTS[site]
+    start = time.perf_counter()
+    ready = False
+    try:
+        if (site, kind) not in OPTIONAL_MARKERS:
+            page.wait_for_selector(READY_SELECTORS[site][kind], state='attached', timeout=timeout)
+            ready = True
+            return True
+        page.wait_for_load_state('domcontentloaded', timeout=timeout)
+        ready = True
+        try:
+            page.wait_for_selector(READY_SELECTORS[site][kind], state='attached', timeout=OPTIONAL_GRACE)
+            return True
+        except PlaywrightTimeoutError:
+            if page_blocked(page):
+                ready = False
+                raise BlockedError(f'{page.url} 被拦截')
+            METRICS.inc('ready_absent_total', kind=kind)
+            return False
+    finally:
+        record_wait(site, kind, time.perf_counter() - start, ready)
+
+
+def wait_for_growth(page, site, kind, previous_height, timeout=None):
+    """滚动后等待页面高度增长，返回是否加载出了新内容"""
+    timeout = timeout or SITE_TIMEOUTS[site]
+    start = time.perf_counter()
+    ready = False
+    try:
+        page.wait_for_function('h => document.body.scrollHeight > h', arg=previous_height, timeout=timeout)
+        ready = True
+    except PlaywrightTimeoutError:
+        pass
+    finally:
+        record_wait(site, kind, time.perf_counter() - start, ready)
+    return ready
+
+
+def wait_replaced(page, site, kind, old_element, timeout=None):
+    """翻页后等待旧元素被替换，再等待新内容的标志元素出现"""
+    timeout = timeout or SITE_TIMEOUTS[site]
+    start = time.perf_counter()
+    ready = False
+    try:
+        old_element.wait_for_element_state('hidden', timeout=timeout)
+        page.wait_for_selector(READY_SELECTORS[site][kind], state='attached', timeout=timeout)
+        ready = True
+    finally:
+        record_wait(site, kind, time.perf_counter() - start, ready)
+
+
+def wait_summary():
+    """按 (站点, 页面类型) 汇总等待次数、超时次数、平均与最大耗时"""
+    summary = {}
+    for (site, kind), samples in sorted(WAIT_STATS.items()):
+        durations = [elapsed for elapsed, _ in samples]
+        summary[f'{site}.{kind}'] = {
+            'count': len(samples),
+            'timeouts': sum(1 for _, ready in samples if not ready),
+            'total': round(sum(durations), 3),
+            'mean': round(sum(durations) / len(durations), 3),
+            'max': round(max(durations), 3),
+        }
+    return summary
+
+
+def log_wait_summary(logger):
+    for name, stats in wait_summary().items():
+        logger.info(f"等待 {name}: {stats['count']} 次, 超时 {stats['timeouts']} 次, "
+                    f"平均 {stats['mean']}s, 最长 {stats['max']}s, 共 {stats['total']}s")
@@ -0,0 +1,94 @@
+import json
+import sqlite3
+import argparse
+from pathlib import Path
+
+from checkpoint import CheckpointStore
+
+# 不属于评价内容的列
+META_COLUMNS = {'id', '评价ID', '车名', '用户ID', 'source_file'}
+
+
+def section_columns(columns):
+    """从表的列名中找出评价段落及其评分列，返回 [(段落标题, 评分列或 None)]"""
+    column_set = set(columns)
+    return [(name, f'{name}评分' if f'{name}评分' in column_set else None)
+            for name in columns if name not in META_COLUMNS and not name.endswith('评分')]
+
+
+def normalize_row(row, sections):
+    """将一行宽表评价展开为每个段落一条记录，跳过没有内容的段落"""
+    records = []
+    for title, score_column in sections:
+        text = row[title]
+        if not text:
+            continue
+        records.append({
+            'review_id': row['评价ID'] if '评价ID' in row.keys() else None,
+            'car': row['车名'],
+            'user': row['用户ID'],
+            'section': title,
+            'text': text,
+            'score': row[score_column] if score_column else None,
+        })
+    return records
+
+
+def iter_reviews(db_path, chunk_size=1000, cursor=0, table_name='reviews'):
+    """流式读取评价库，逐块产出 (记录列表, 游标)
+
+    按主键 id 做键集分页，每次只从数据库取 chunk_size 行，内存占用与库的大小无关。
+    游标是本块最后一行的 id，保存后传回 cursor 参数即可从下一行继续。
+    sqlite_autohome 重新导入变化的文件时已有的行保留原来的 id，新行的 id 更大，
+    因此续传既不会重复导出旧行，也不会漏掉新导入的行（已导出的行内容更新后不会再次导出）。
+    """
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+        sections = section_columns(columns)
+        query = f'SELECT * FROM {table_name} WHERE id > ? ORDER BY id LIMIT ?'
+        while True:
+            rows = conn.execute(query, (cursor, chunk_size)).fetchall()
+            if not rows:
+                return
+            cursor = rows[-1]['id']
+            records = []
+            for row in rows:
+                records.extend(normalize_row(row, sections))
+            yield records, cursor
+    finally:
+        conn.close()
+
+
+def export_jsonl(db_path, output_path, chunk_size=1000, resume=True):
+    """将评价逐块追加写入 JSONL 语料，每块写入后保存游标，中断后可从断点继续"""
+    store = CheckpointStore(Path(db_path).parent / 'checkpoints.db')
+    key = str(Path(output_path).resolve())
+    cursor = store.get('review_stream', key, 0) if resume else 0
+    mode = 'a' if resume and cursor else 'w'
+
+    written = 0
+    with open(output_path, mode, encoding='utf-8') as output_file:
+        for records, cursor in iter_reviews(db_path, chunk_size, cursor):
+            for record in records:
+                output_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            output_file.flush()
+            store.put('review_stream', key, cursor)
+            written += len(records)
+    store.close()
+    print(f"已写入 {written} 条评价段落到 {output_path}（游标 {cursor}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='将评价库流式导出为 (车名, 用户, 段落标题, 内容, 评分) 的 JSONL 语料')
+    parser.add_argument('--db', default='autohome_reviews/db/reviews.db')
+    parser.add_argument('--output', default='autohome_reviews/reviews.jsonl')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--restart', action='store_true', help='忽略已保存的游标，从头重新导出')
+    args = parser.parse_args()
+    export_jsonl(args.db, args.output, args.chunk_size, resume=not args.restart)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import os
+from collections import Counter
+from urllib.parse import urlsplit
+
+# 各站点默认的请求路由策略：按资源类型屏蔽，再按域名黑白名单过滤
+SITE_POLICIES = {
+    'dcd': {
+        'block_types': ['image', 'media', 'font'],
+        'allow_domains': [],
+        'deny_domains': ['mcs.snssdk.com', 'mon.snssdk.com', 'hm.baidu.com',
+                         'google-analytics.com', 'googletagmanager.com'],
+    },
+    'autohome': {
+        'block_types': ['image', 'media', 'font'],
+        'allow_domains': [],
+        'deny_domains': ['adproxy.autohome.com.cn', 'hm.baidu.com', 'cnzz.com',
+                         'google-analytics.com', 'googletagmanager.com', 'doubleclick.net'],
+    },
+}
+
+# 被屏蔽的请求无法得知真实大小，未观察到同类型响应时用这些估计值（字节）
+DEFAULT_RESOURCE_SIZES = {
+    'image': 30 * 1024,
+    'media': 500 * 1024,
+    'font': 50 * 1024,
+    'stylesheet': 20 * 1024,
+    'script': 40 * 1024,
+}
+DEFAULT_RESOURCE_SIZE = 5 * 1024
+
+
+def env_list(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def domain_matches(host, domains):
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+class RoutingPolicy:
+    """按资源类型和域名决定放行或屏蔽请求，并统计放行/屏蔽数量及节省的流量"""
+
+    def __init__(self, site, headers=None, block_types=(), allow_domains=(), deny_domains=()):
+        self.site = site
+        self.headers = headers or {}
+        self.block_types = set(block_types)
+        self.allow_domains = list(allow_domains)
+        self.deny_domains = list(deny_domains)
+        self.passed = Counter()
+        self.blocked = Counter()
+        self.passed_bytes = Counter()
+        self.sized_responses = Counter()
+
+    @classmethod
+    def from_env(cls, site, headers=None):
+        """读取站点默认策略，可用 {SITE}_BLOCK_TYPES / _ALLOW_DOMAINS / _DENY_DOMAINS 覆盖（逗号分隔）"""
+        defaults = SITE_POLICIES[site]
+        prefix = site.upper()
+        return cls(
+            site,
+            headers=headers,
+            block_types=env_list(f'{prefix}_BLOCK_TYPES', defaults['block_types']),
+            allow_domains=env_list(f'{prefix}_ALLOW_DOMAINS', defaults['allow_domains']),
+            deny_domains=env_list(f'{prefix}_DENY_DOMAINS', defaults['deny_domains']),
+        )
+
+    def block_reason(self, request):
+        """返回屏蔽原因，放行时返回 None"""
+        if request.resource_type in self.block_types:
+            return 'type'
+        host = urlsplit(request.url).hostname or ''
+        if domain_matches(host, self.deny_domains):
+            return 'deny_domain'
+        if self.allow_domains and not domain_matches(host, self.allow_domains):
+            return 'not_allowed'
+        return None
+
+    def handle_route(self, route, request):
+        reason = self.block_reason(request)
+        if reason:
+            self.blocked[(request.resource_type, reason)] += 1
+            route.abort()
+        else:
+            self.passed[request.resource_type] += 1
+            route.continue_(headers={**request.headers, **self.headers})
+
+    def handle_response(self, response):
+        length = response.headers.get('content-length')
+        if length and length.isdigit():
+            resource_type = response.request.resource_type
+            self.passed_bytes[resource_type] += int(length)
+            self.sized_responses[resource_type] += 1
+
+    def install(self, context):
+        """注册到浏览器上下文，之后打开的所有页面都会经过该策略"""
+        context.route('**/*', self.handle_route)
+        context.on('response', self.handle_response)
+
+    def estimated_size(self, resource_type):
+        if self.sized_responses[resource_type]:
+            return self.passed_bytes[resource_type] / self.sized_responses[resource_type]
+        return DEFAULT_RESOURCE_SIZES.get(resource_type, DEFAULT_RESOURCE_SIZE)
+
+    def summary(self):
+        blocked_by_type = Counter()
+        blocked_by_reason = Counter()
+        for (resource_type, reason), count in self.blocked.items():
+            blocked_by_type[resource_type] += count
+            blocked_by_reason[reason] += count
+        return {
+            'passed': sum(self.passed.values()),
+            'blocked': sum(self.blocked.values()),
+            'blocked_by_type': dict(blocked_by_type),
+            'blocked_by_reason': dict(blocked_by_reason),
+            'passed_bytes': sum(self.passed_bytes.values()),
+            'estimated_bytes_saved': int(sum(self.estimated_size(t) * n for t, n in blocked_by_type.items())),
+        }
+
+    def log_summary(self, logger):
+        stats = self.summary()
+        logger.info(f"请求路由 [{self.site}]: 放行 {stats['passed']} 个, 屏蔽 {stats['blocked']} 个 "
+                    f"{stats['blocked_by_type']}, 估计节省 {stats['estimated_bytes_saved'] / 1024 / 1024:.1f} MB")
@@ -1,7 +1,11 @@
 import os
+import time
+import csv
 import sqlite3
-import pandas as pd
 from pathlib import Path
+from csv_store import read_header, iter_chunks
+from import_manifest import ensure_manifest, check_file, record_file
+from import_pipeline import parallel_parse
 
 # 定义目录和数据库文件路径
 csv_directory = './autohome_reviews'
@@ -9,48 +13,36 @@ db_directory = './autohome_reviews/db'
 db_file = os.path.join(db_directory, 'reviews.db')
 table_name = 'reviews'
 
-# 创建数据库目录（如果不存在）
-Path(db_directory).mkdir(parents=True, exist_ok=True)
+# 每次 executemany 插入的行数，也是流式读取CSV时每块的行数
+BATCH_SIZE = 5000
 
-# 创建数据库连接
-conn = sqlite3.connect(db_file)
-cursor = conn.cursor()
+# 超过该大小的CSV不整体交给子进程解析，而是在写入进程中分块流式导入，内存占用与文件大小无关
+STREAM_THRESHOLD = int(os.environ.get('AUTOHOME_STREAM_BYTES', 64 * 1024 * 1024))
+# 同时在子进程中解析、等待写入的小文件的总大小上限：解析结果整体在内存中，并经 pickle 传回写入进程
+PARSE_BYTES = int(os.environ.get('AUTOHOME_PARSE_BYTES', 256 * 1024 * 1024))
 
-# 获取所有CSV文件
-csv_files = [f for f in os.listdir(csv_directory) if f.endswith('.csv')]
+# 导入期间使用的 SQLite 设置：WAL 日志、不等待落盘、临时数据放内存、约 200MB 页缓存
+IMPORT_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=OFF',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-200000',
+]
 
-if not csv_files:
-    print("没有找到CSV文件。")
-    exit()
+def connect(db_path):
+    """创建数据库连接并应用导入用的设置"""
+    conn = sqlite3.connect(db_path)
+    for pragma in IMPORT_PRAGMAS:
+        conn.execute(pragma)
+    return conn
 
-# 创建表时的初始列集
-existing_columns = set()
+def get_table_columns(cursor):
+    """返回表中已有的列名，表不存在时返回 None"""
+    columns = [row[1] for row in cursor.execute(f'PRAGMA table_info("{table_name}")')]
+    return set(columns) if columns else None
 
-# 定义函数以动态添加列
-def add_missing_columns(new_columns):
-    """动态添加表中不存在的新列"""
-    for column in new_columns:
-        if column not in existing_columns:
-            alter_table_sql = f'ALTER TABLE {table_name} ADD COLUMN "{column}" TEXT;'
-            cursor.execute(alter_table_sql)
-            existing_columns.add(column)
-            print(f"添加新列: {column}")
-
-# 检查表是否存在
-cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}';")
-table_exists = cursor.fetchone()
-
-if not table_exists:
-    # 如果表不存在，使用第一个CSV文件创建表
-    first_file = csv_files[0]
-    first_file_path = os.path.join(csv_directory, first_file)
-    
-    df = pd.read_csv(first_file_path, on_bad_lines='skip')
-    existing_columns = set(df.columns)
-    
-    columns_str = ', '.join([f'"{col}" TEXT' for col in existing_columns])
-    
-    # 创建表
+def create_table(cursor, columns):
+    columns_str = ', '.join([f'"{col}" TEXT' for col in columns])
     create_table_sql = f'''
     CREATE TABLE IF NOT EXISTS {table_name} (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -60,35 +52,254 @@ if not table_exists:
     cursor.execute(create_table_sql)
     print(f"表 '{table_name}' 已创建。")
 
-# 遍历所有CSV文件并插入数据
-for csv_file in csv_files:
-    file_path = os.path.join(csv_directory, csv_file)
-    
-    try:
-        df = pd.read_csv(file_path, on_bad_lines='skip')
-    except pd.errors.ParserError as e:
-        print(f"读取文件 {csv_file} 时发生错误: {e}")
-        continue
-    
-    # 检查并添加缺失的列
-    new_columns = set(df.columns) - existing_columns
-    if new_columns:
-        add_missing_columns(new_columns)
-    
-    # 将数据插入到数据库表中
-    for row in df.itertuples(index=False, name=None):
-        placeholders = ', '.join(['?' for _ in row])
-        insert_sql = f'INSERT INTO {table_name} ({", ".join(df.columns)}) VALUES ({placeholders})'
+def add_missing_columns(cursor, existing_columns, new_columns):
+    """动态添加表中不存在的新列"""
+    for column in new_columns:
+        if column not in existing_columns:
+            alter_table_sql = f'ALTER TABLE {table_name} ADD COLUMN "{column}" TEXT;'
+            cursor.execute(alter_table_sql)
+            existing_columns.add(column)
+            print(f"添加新列: {column}")
+
+def read_columns(file_path):
+    """返回CSV的列名，末尾追加来源文件列"""
+    return read_header(file_path) + ['source_file']
+
+def read_chunks(file_path):
+    """流式读取评价CSV，逐块产出追加了来源文件的行，空值为 None"""
+    csv_file = os.path.basename(file_path)
+    for chunk in iter_chunks(file_path, BATCH_SIZE):
+        yield [row + [csv_file] for row in chunk]
+
+def parse_csv_file(file_path):
+    """在子进程中读取整个CSV，返回 (列名, 行块列表)，只用于较小的文件"""
+    return read_columns(file_path), list(read_chunks(file_path))
+
+def ensure_review_index(cursor):
+    """评价ID 唯一索引，导入时按评价ID更新已有的行，行的 id 保持不变
+
+    之前的导入方式可能留下评价ID重复的行，建索引前只保留每个评价ID最后导入的一行。
+    """
+    index_name = f'idx_{table_name}_review_id'
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (index_name,)).fetchone():
+        return
+    cursor.execute(f'DELETE FROM {table_name} WHERE "评价ID" IS NOT NULL AND id NOT IN '
+                   f'(SELECT MAX(id) FROM {table_name} WHERE "评价ID" IS NOT NULL GROUP BY "评价ID")')
+    cursor.execute(f'CREATE UNIQUE INDEX {index_name} ON {table_name} ("评价ID")')
+
+def insert_rows(cursor, columns, chunks):
+    """用一条预先构建好的 INSERT 语句逐块写入"""
+    columns_sql = ', '.join(f'"{col}"' for col in columns)
+    placeholders = ', '.join('?' * len(columns))
+    insert_sql = f'INSERT INTO {table_name} ({columns_sql}) VALUES ({placeholders})'
+    inserted = 0
+    for chunk in chunks:
+        cursor.executemany(insert_sql, chunk)
+        inserted += len(chunk)
+    return inserted
+
+def upsert_rows(cursor, columns, chunks):
+    """按评价ID插入或更新，已有的评价保留原来的 id；文件中出现的评价ID记在临时表 import_ids 中"""
+    columns_sql = ', '.join(f'"{col}"' for col in columns)
+    placeholders = ', '.join('?' * len(columns))
+    updates = ', '.join(f'"{col}"=excluded."{col}"' for col in columns if col != '评价ID')
+    upsert_sql = (f'INSERT INTO {table_name} ({columns_sql}) VALUES ({placeholders}) '
+                  f'ON CONFLICT ("评价ID") DO UPDATE SET {updates}')
+    id_index = columns.index('评价ID')
+    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS import_ids ("评价ID" TEXT PRIMARY KEY)')
+    cursor.execute('DELETE FROM temp.import_ids')
+    written = 0
+    for chunk in chunks:
+        cursor.executemany(upsert_sql, chunk)
+        cursor.executemany('INSERT OR IGNORE INTO temp.import_ids VALUES (?)',
+                           [(row[id_index],) for row in chunk if row[id_index] is not None])
+        written += len(chunk)
+    return written
+
+class LegacyRowSync:
+    """没有评价ID的行无法按评价ID对应，但旧版文件只在末尾追加：逐行与该文件已导入的同类行按顺序对比，
+    相同的前缀保留（id 不变），从第一处不同开始删除旧行，之后的行重新写入
+
+    condition 用于在混合文件中只对比评价ID为空的行。add() 按文件顺序逐行传入，finish() 返回传入的行数。
+    """
+
+    def __init__(self, cursor, csv_file, columns, condition='1'):
+        self.cursor = cursor
+        self.csv_file = csv_file
+        self.columns = columns
+        self.condition = condition
+        columns_sql = ', '.join(f'"{col}"' for col in columns)
+        self.existing = cursor.connection.cursor()
+        self.existing.execute(f'SELECT id, {columns_sql} FROM {table_name} '
+                              f'WHERE source_file=? AND {condition} ORDER BY id', (csv_file,))
+        self.diverged = False
+        self.pending = []
+        self.count = 0
+
+    def add(self, row):
+        self.count += 1
+        if not self.diverged:
+            old = self.existing.fetchone()
+            if old is not None and list(old[1:]) == row:
+                return
+            self.diverge(old)
+        self.pending.append(row)
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def diverge(self, old):
+        """停止对比，删除 old 及之后的旧行；old 为 None 时旧行都已对上"""
+        self.diverged = True
+        self.existing.close()
+        if old is not None:
+            self.cursor.execute(f'DELETE FROM {table_name} WHERE source_file=? AND {self.condition} AND id >= ?',
+                                (self.csv_file, old[0]))
+
+    def flush(self):
+        if self.pending:
+            insert_rows(self.cursor, self.columns, [self.pending])
+            self.pending = []
+
+    def finish(self):
+        if not self.diverged:
+            # 文件比已导入的行短时，多出的旧行要删除
+            self.diverge(self.existing.fetchone())
+        self.flush()
+        return self.count
+
+def import_file(conn, csv_file, parsed, info, existing_columns):
+    """在一个事务中写入单个CSV文件并更新清单，返回导入的行数
+
+    parsed 为 (列名, 行块)，行块可以是子进程解析好的列表，也可以是流式读取的生成器。
+    有评价ID列的文件按评价ID更新，只删除文件中已经没有的评价；没有评价ID的行（旧版文件或补上评价ID列之前写入的行）
+    保留未变化的前缀。
+    已导入的行 id 保持不变，review_stream 按 id 保存的导出游标在重新导入后仍然有效。
+    """
+    columns, chunks = parsed
+
+    with conn:
+        cursor = conn.cursor()
+        # 显式开启事务，让新增列和索引也随事务提交或回滚
+        cursor.execute('BEGIN')
+        # 列的变化每个文件只处理一次
+        new_columns = set(columns) - existing_columns
+        if new_columns:
+            add_missing_columns(cursor, existing_columns, new_columns)
+            if '评价ID' in new_columns:
+                ensure_review_index(cursor)
+        if '评价ID' in columns:
+            # BufferedCsvWriter 给旧文件补上评价ID列后，之前写入的行评价ID为空，按旧版文件的方式对比
+            id_index = columns.index('评价ID')
+            legacy = LegacyRowSync(cursor, csv_file, columns, '"评价ID" IS NULL')
+
+            def rows_with_id():
+                for chunk in chunks:
+                    rows = []
+                    for row in chunk:
+                        if row[id_index] is None:
+                            legacy.add(row)
+                        else:
+                            rows.append(row)
+                    yield rows
+
+            inserted = upsert_rows(cursor, columns, rows_with_id())
+            inserted += legacy.finish()
+            cursor.execute(f'DELETE FROM {table_name} WHERE source_file=? AND "评价ID" NOT IN '
+                           f'(SELECT "评价ID" FROM temp.import_ids)', (csv_file,))
+        else:
+            legacy = LegacyRowSync(cursor, csv_file, columns)
+            for chunk in chunks:
+                for row in chunk:
+                    legacy.add(row)
+            inserted = legacy.finish()
+        record_file(conn, csv_file, info, inserted)
+    return inserted
+
+def main():
+    # 创建数据库目录（如果不存在）
+    Path(db_directory).mkdir(parents=True, exist_ok=True)
+
+    # 获取所有CSV文件
+    csv_files = sorted(f for f in os.listdir(csv_directory) if f.endswith('.csv'))
+
+    if not csv_files:
+        print("没有找到CSV文件。")
+        return
+
+    conn = connect(db_file)
+    cursor = conn.cursor()
+
+    existing_columns = get_table_columns(cursor)
+    if existing_columns is None:
+        # 如果表不存在，使用第一个CSV文件创建表
+        first_columns = read_columns(os.path.join(csv_directory, csv_files[0]))
+        with conn:
+            create_table(cursor, first_columns)
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table_name}_source_file ON {table_name} (source_file)')
+        existing_columns = set(first_columns)
+    if '评价ID' in existing_columns:
+        with conn:
+            ensure_review_index(cursor)
+
+    if ensure_manifest(conn):
+        # 清单建立之前导入的行没有来源文件，无法按文件更新；本次会从CSV重新导入，先删除它们
+        with conn:
+            if 'source_file' not in existing_columns:
+                add_missing_columns(cursor, existing_columns, ['source_file'])
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table_name}_source_file ON {table_name} (source_file)')
+            deleted = cursor.execute(f'DELETE FROM {table_name} WHERE source_file IS NULL').rowcount
+        if deleted:
+            print(f"已删除 {deleted} 行没有来源记录的旧数据，将从CSV重新导入。")
+
+    # 跳过自上次导入以来没有变化的文件；大文件单独流式导入
+    changed = {}
+    large_files = []
+    skipped = 0
+    for csv_file in csv_files:
+        file_path = os.path.join(csv_directory, csv_file)
+        status, info = check_file(conn, csv_file, file_path)
+        if status == 'unchanged':
+            skipped += 1
+            continue
+        changed[file_path] = (status, info)
+        if info['size'] > STREAM_THRESHOLD:
+            large_files.append(file_path)
+
+    def parsed_files():
+        # 小文件在子进程中解析，当前进程作为唯一的写入者按解析完成的顺序写入；在途文件的总大小不超过 PARSE_BYTES
+        small_files = [file_path for file_path in changed if file_path not in large_files]
+        yield from parallel_parse(small_files, parse_csv_file, task_bytes=lambda file_path: changed[file_path][1]['size'],
+                                  max_bytes=PARSE_BYTES)
+        for file_path in large_files:
+            yield file_path, (read_columns(file_path), read_chunks(file_path)), None
+
+    total_rows = 0
+    start_time = time.perf_counter()
+    for file_path, parsed, error in parsed_files():
+        csv_file = os.path.basename(file_path)
+        if error:
+            print(f"解析文件 {csv_file} 时发生错误: {error}")
+            continue
+
+        status, info = changed[file_path]
+        file_start = time.perf_counter()
         try:
-            cursor.execute(insert_sql, row)
-        except sqlite3.OperationalError as e:
-            print(f"插入数据时出错: {e}")
-            print(f"SQL语句: {insert_sql}")
-            print(f"行数据: {row}")
+            rows = import_file(conn, csv_file, parsed, info, existing_columns)
+        except (csv.Error, sqlite3.OperationalError) as e:
+            print(f"导入文件 {csv_file} 时发生错误: {e}")
+            # 事务回滚后新增的列也被撤销，重新读取表结构
+            existing_columns = get_table_columns(cursor)
             continue
 
-# 提交更改并关闭连接
-conn.commit()
-conn.close()
+        total_rows += rows
+        elapsed = time.perf_counter() - file_start
+        total_elapsed = time.perf_counter() - start_time
+        print(f"已导入 {csv_file} ({'新文件' if status == 'new' else '已更新'}): {rows} 行, {rows / max(elapsed, 1e-9):.0f} 行/秒 "
+              f"(累计 {total_rows} 行, {total_rows / max(total_elapsed, 1e-9):.0f} 行/秒)")
+
+    conn.close()
+
+    print(f"数据导入完成，共 {total_rows} 行，跳过 {skipped} 个未变化的文件，用时 {time.perf_counter() - start_time:.1f} 秒。")
 
-print("数据导入完成。")
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,11 @@
-import os
+import re
 import csv
 import sqlite3
-import re
-import pypinyin
 from pathlib import Path
 from collections import Counter
-
-def convert_to_pinyin(name):
-    """将名称中的中文字符转换为拼音"""
-    return ''.join(pypinyin.lazy_pinyin(name))
-
-def sanitize_table_name(filename):
-    """将文件名转换为可以在SQLite中用作表名的格式"""
-    name, _ = os.path.splitext(filename)
-    name = re.sub(r'[^\w]', '_', name)  # 将非字母数字的字符替换为下划线
-    # 如果名称中包含非ASCII字符（例如中文），则转换为拼音
-    if not all(ord(char) < 128 for char in name):
-        name = convert_to_pinyin(name)
-    return name
+from import_manifest import ensure_manifest, check_file, record_file
+from dcd_schema import TYPED_COLUMNS, extract_typed, parse_number
+from import_pipeline import parallel_parse
 
 def make_unique_fieldnames(fieldnames):
     """处理重复的列名，确保每个列名在表中唯一"""
@@ -35,48 +23,141 @@ def make_unique_fieldnames(fieldnames):
             result.append(unique_name)
         else:
             result.append(name)
-    
-    return result
 
-def create_table(cursor, table_name, fieldnames):
-    """创建一个SQLite表，表名和列名根据CSV文件内容确定"""
-    unique_fieldnames = make_unique_fieldnames(fieldnames)
-    columns = [f'"{name}" TEXT' for name in unique_fieldnames]
-    columns_sql = ", ".join(columns)
-    create_table_sql = f'CREATE TABLE IF NOT EXISTS "{table_name}" ({columns_sql});'
-    cursor.execute(create_table_sql)
-
-def insert_data(cursor, table_name, fieldnames, rows):
-    """将数据插入到SQLite表中"""
-    unique_fieldnames = make_unique_fieldnames(fieldnames)
-    fieldnames_sql = ', '.join(f'"{name}"' for name in unique_fieldnames)
-    placeholders = ', '.join('?' * len(unique_fieldnames))
-    insert_sql = f'INSERT INTO "{table_name}" ({fieldnames_sql}) VALUES ({placeholders})'
-
-    # 打印 SQL 语句用于调试
-    print(f"Executing SQL: {insert_sql}")
-    
-    cursor.executemany(insert_sql, rows)
-
-def process_csv_file(db_conn, csv_file_path):
-    """处理单个CSV文件，并将其数据插入到SQLite数据库中"""
-    table_name = sanitize_table_name(csv_file_path.stem)
-    with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        fieldnames = reader.fieldnames
-        if not fieldnames:
-            return  # 跳过空的CSV文件
+    return result
 
+def create_schema(cursor):
+    """创建统一的参数库：车系、车型（含常用筛选列）、属性和属性值，返回是否为新建"""
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='series'").fetchone()
+    typed_columns_sql = ', '.join(f'{name} {sql_type}' for name, sql_type in TYPED_COLUMNS.items())
+    cursor.executescript(f'''
+        CREATE TABLE IF NOT EXISTS series (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            source_file TEXT
+        );
+        CREATE TABLE IF NOT EXISTS trims (
+            id INTEGER PRIMARY KEY,
+            series_id INTEGER NOT NULL REFERENCES series(id) ON DELETE CASCADE,
+            name TEXT NOT NULL,
+            {typed_columns_sql}
+        );
+        CREATE TABLE IF NOT EXISTS attributes (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS param_values (
+            trim_id INTEGER NOT NULL REFERENCES trims(id) ON DELETE CASCADE,
+            attribute_id INTEGER NOT NULL REFERENCES attributes(id),
+            value TEXT,
+            value_num REAL,
+            PRIMARY KEY (trim_id, attribute_id)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_trims_series ON trims (series_id);
+        CREATE INDEX IF NOT EXISTS idx_trims_price ON trims (price_wan);
+        CREATE INDEX IF NOT EXISTS idx_trims_level ON trims (level);
+        CREATE INDEX IF NOT EXISTS idx_trims_energy_type ON trims (energy_type);
+        CREATE INDEX IF NOT EXISTS idx_trims_range ON trims (range_km);
+        CREATE INDEX IF NOT EXISTS idx_trims_power ON trims (power_kw);
+        CREATE INDEX IF NOT EXISTS idx_param_values_attribute ON param_values (attribute_id, value_num);
+
+        CREATE VIEW IF NOT EXISTS trim_params AS
+            SELECT s.name AS series, t.name AS trim, a.name AS attribute, v.value, v.value_num
+            FROM param_values v
+            JOIN trims t ON t.id = v.trim_id
+            JOIN series s ON s.id = t.series_id
+            JOIN attributes a ON a.id = v.attribute_id;
+    ''')
+    return not exists
+
+def legacy_table_pattern(stem):
+    """旧版由CSV文件名生成表名：非单词字符替换为下划线，含中文时转换为拼音。返回匹配该表名的正则"""
+    name = re.sub(r'[^\w]', '_', stem)
+    if all(ord(char) < 128 for char in name):
+        return re.compile(re.escape(name))
+    # 每个中文字符转换为一段小写拼音，其余字符保持不变
+    parts = [re.escape(char) if ord(char) < 128 else f'(?:[a-z]+|{re.escape(char)})' for char in name]
+    return re.compile(''.join(parts))
+
+def drop_legacy_tables(cursor, csv_dir):
+    """删除旧版按车系建立的单表（这些表都可以由CSV重新生成）
+
+    只删除表名与 csv_dir 中某个 *_参数.csv 对应的表，库中的其他表保持不变。
+    """
+    patterns = [legacy_table_pattern(csv_file_path.stem) for csv_file_path in Path(csv_dir).glob('*_参数.csv')]
+    known = {'series', 'trims', 'attributes', 'param_values', 'import_manifest'}
+    tables = [row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+              if row[0] not in known and any(pattern.fullmatch(row[0]) for pattern in patterns)]
+    for table in tables:
+        cursor.execute(f'DROP TABLE "{table}"')
+    return len(tables)
+
+def get_attribute_ids(cursor, names, cache):
+    """返回属性名对应的ID，新属性会被插入；cache 在整个导入过程中复用"""
+    missing = [name for name in names if name not in cache]
+    if missing:
+        cursor.executemany('INSERT OR IGNORE INTO attributes (name) VALUES (?)', [(name,) for name in missing])
+        for name in missing:
+            cache[name] = cursor.execute('SELECT id FROM attributes WHERE name=?', (name,)).fetchone()[0]
+    return [cache[name] for name in names]
+
+def series_name_from_file(csv_file_path):
+    stem = csv_file_path.stem
+    return stem[:-len('_参数')] if stem.endswith('_参数') else stem
+
+def parse_csv_file(csv_file_path):
+    """在子进程中读取并规范化单个CSV
+
+    返回 {'series_name', 'attribute_names', 'trims': [(车型名, 强类型列, [(属性序号, 值, 数值)])]}，空文件返回 None。
+    """
+    with open(csv_file_path, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if not header:
+            return None  # 跳过空的CSV文件
+        rows = [row for row in reader if row]
+
+    attribute_names = make_unique_fieldnames(header)[1:]
+    trims = []
+    for row in rows:
+        typed = extract_typed(dict(zip(attribute_names, row[1:])))
+        values = [(index, value, parse_number(value)) for index, value in enumerate(row[1:]) if value]
+        trims.append((row[0], tuple(typed[name] for name in TYPED_COLUMNS), values))
+    return {'series_name': series_name_from_file(csv_file_path), 'attribute_names': attribute_names, 'trims': trims}
+
+def write_series(db_conn, csv_file_path, info, parsed, attribute_cache):
+    """将解析结果写入统一的参数库，返回车型数
+
+    先删除该车系已有的车型和参数，再在同一事务中重新写入并更新导入清单。
+    """
+    typed_names = list(TYPED_COLUMNS)
+    trim_insert_sql = (f'INSERT INTO trims (series_id, name, {", ".join(typed_names)}) '
+                       f'VALUES ({", ".join("?" * (len(typed_names) + 2))})')
+
+    with db_conn:
         cursor = db_conn.cursor()
-
-        # 如果表不存在则创建表
-        create_table(cursor, table_name, fieldnames)
-
-        # 插入数据
-        rows = [tuple(row.get(col, 'NULL') for col in fieldnames) for row in reader]
-        insert_data(cursor, table_name, fieldnames, rows)
-
-        db_conn.commit()
+        cursor.execute('BEGIN')
+        cursor.execute('DELETE FROM series WHERE name=?', (parsed['series_name'],))
+        series_id = cursor.execute('INSERT INTO series (name, source_file) VALUES (?, ?)',
+                                   (parsed['series_name'], csv_file_path.name)).lastrowid
+
+        attribute_ids = get_attribute_ids(cursor, parsed['attribute_names'], attribute_cache)
+        values = []
+        for trim_name, typed, trim_values in parsed['trims']:
+            trim_id = cursor.execute(trim_insert_sql, (series_id, trim_name, *typed)).lastrowid
+            values.extend((trim_id, attribute_ids[index], value, value_num) for index, value, value_num in trim_values)
+        cursor.executemany('INSERT INTO param_values (trim_id, attribute_id, value, value_num) VALUES (?, ?, ?, ?)',
+                           values)
+        record_file(db_conn, csv_file_path.name, info, len(parsed['trims']))
+    return len(parsed['trims'])
+
+def write_empty(db_conn, csv_file_path, info):
+    """空CSV：删除该车系之前导入的数据，并在导入清单中记为 0 行，避免每次都重新检查"""
+    with db_conn:
+        db_conn.execute('DELETE FROM series WHERE name=?', (series_name_from_file(csv_file_path),))
+        record_file(db_conn, csv_file_path.name, info, 0)
+    return 0
 
 def main():
     base_dir = Path('../dcd_data')  # 更新后的相对目录路径
@@ -88,11 +169,49 @@ def main():
 
     # 连接到SQLite数据库（如果数据库不存在，将自动创建）
     db_conn = sqlite3.connect(db_file)
+    db_conn.execute('PRAGMA foreign_keys=ON')
+    ensure_manifest(db_conn)
+
+    cursor = db_conn.cursor()
+    if create_schema(cursor):
+        # 旧版每个车系一张表，清单记录的是旧表的导入状态，改用统一结构后全部重新导入
+        dropped = drop_legacy_tables(cursor, base_dir)
+        cursor.execute('DELETE FROM import_manifest')
+        db_conn.commit()
+        if dropped:
+            print(f"已删除 {dropped} 张旧版车系表，所有CSV将导入统一的参数库")
 
-    # 处理目录中的每个CSV文件
+    # 跳过自上次导入以来没有变化的文件
+    changed = {}
+    skipped = 0
     for csv_file_path in base_dir.glob('*.csv'):
-        process_csv_file(db_conn, csv_file_path)
-        print(f"已处理 {csv_file_path.name}")
+        status, info = check_file(db_conn, csv_file_path.name, csv_file_path)
+        if status == 'unchanged':
+            skipped += 1
+        else:
+            changed[csv_file_path] = (status, info)
+
+    # 多进程解析，当前进程作为唯一的写入者
+    attribute_cache = {}
+    for csv_file_path, parsed, error in parallel_parse(changed, parse_csv_file):
+        if error:
+            print(f"解析 {csv_file_path.name} 时出错: {error}")
+            continue
+        status, info = changed[csv_file_path]
+        try:
+            if parsed is None:
+                rows = write_empty(db_conn, csv_file_path, info)
+            else:
+                rows = write_series(db_conn, csv_file_path, info, parsed, attribute_cache)
+        except sqlite3.Error as e:
+            # 事务已回滚，该文件下次导入时重试；回滚也撤销了本次新增的属性，缓存需要重建
+            print(f"写入 {csv_file_path.name} 时出错: {e}")
+            attribute_cache.clear()
+            continue
+        print(f"已处理 {csv_file_path.name}（{'新文件' if status == 'new' else '已更新'}，{rows} 个车型）")
+
+    if skipped:
+        print(f"跳过 {skipped} 个未变化的文件")
 
     db_conn.close()
     print(f"数据已导入到 {db_file}")
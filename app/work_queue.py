@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+# 租约时长（秒），worker 每隔三分之一租约续期一次，超过租约没有续期的任务会被其他 worker 重新领取
+LEASE_SECONDS = int(os.environ.get('WORK_LEASE_SECONDS', 300))
+# 每个任务最多尝试的次数
+MAX_ATTEMPTS = int(os.environ.get('WORK_MAX_ATTEMPTS', 3))
+# 队列暂时为空时 worker 的轮询间隔（秒）
+POLL_SECONDS = float(os.environ.get('WORK_POLL_SECONDS', 10))
+# worker 启动时队列已关闭（上一轮留下的状态），等待 coordinator 开始新一轮的最长时间（秒）
+JOIN_SECONDS = float(os.environ.get('WORK_JOIN_SECONDS', 120))
+
+
+def default_worker_id():
+    """容器内的主机名就是容器ID，加上进程号区分同一容器中的多个进程"""
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class WorkQueue:
+    """基于 SQLite 的任务队列，多个容器通过共享卷上的同一个数据库文件协作
+
+    任务以 (queue, key) 唯一，已完成的任务重复入队会被忽略。worker 领取任务时获得租约，
+    完成后标记为 done；失败或租约过期的任务会重新分配，直到达到最大尝试次数。
+    coordinator 每轮开始时调用 open()，轮次号加一；入队完毕后调用 close()，
+    worker 所在的一轮关闭且没有未完成的任务时退出。
+    """
+
+    def __init__(self, db_path, worker_id=None, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(db_path)
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.local = threading.local()
+        with self.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    queue TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    payload TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (queue, key)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (queue, status, lease_expires)')
+            conn.execute('CREATE TABLE IF NOT EXISTS queues (name TEXT PRIMARY KEY, closed INTEGER NOT NULL, '
+                         'run_id INTEGER NOT NULL DEFAULT 0)')
+            # 旧版数据库的 queues 表没有轮次号
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(queues)')]
+            if 'run_id' not in columns:
+                conn.execute('ALTER TABLE queues ADD COLUMN run_id INTEGER NOT NULL DEFAULT 0')
+
+    @property
+    def conn(self):
+        """每个线程使用自己的连接，续租线程和主线程互不影响"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE 在事务开始时就取得写锁，多个 worker 不会领取到同一个任务"""
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def enqueue(self, queue, items, reset=False):
+        """批量入队 {key: payload}，返回新增或重置的数量
+
+        已存在但未完成的任务（包括之前运行中失败的）重新置为待处理并清零尝试次数；
+        已完成的任务默认保持原状，reset=True 时同样重新置为待处理，用于增量重抓。
+        其他 worker 正在持有且租约未过期的任务不受影响。
+        """
+        now = time.time()
+        condition = "NOT (status='leased' AND lease_expires >= excluded.updated_at)"
+        if not reset:
+            condition = f"status != 'done' AND {condition}"
+        with self.transaction() as conn:
+            cursor = conn.executemany(
+                'INSERT INTO tasks (queue, key, payload, updated_at) VALUES (?, ?, ?, ?) '
+                "ON CONFLICT (queue, key) DO UPDATE SET payload=excluded.payload, status='pending', attempts=0, "
+                'lease_owner=NULL, lease_expires=NULL, error=NULL, updated_at=excluded.updated_at '
+                f'WHERE {condition}',
+                [(queue, key, json.dumps(payload, ensure_ascii=False), now) for key, payload in items.items()])
+            conn.execute('INSERT OR IGNORE INTO queues (name, closed) VALUES (?, 0)', (queue,))
+        return cursor.rowcount
+
+    def open(self, queue):
+        """开始新一轮发现，轮次号加一，worker 在本轮关闭之前会一直等待新任务"""
+        with self.transaction() as conn:
+            conn.execute('INSERT INTO queues (name, closed, run_id) VALUES (?, 0, 1) '
+                         'ON CONFLICT (name) DO UPDATE SET closed=0, run_id=run_id + 1', (queue,))
+
+    def close(self, queue):
+        """标记本轮入队完毕"""
+        with self.transaction() as conn:
+            conn.execute('INSERT INTO queues (name, closed) VALUES (?, 1) '
+                         'ON CONFLICT (name) DO UPDATE SET closed=1', (queue,))
+
+    def state(self, queue):
+        """返回 (轮次号, 是否已关闭)，队列不存在时返回 None"""
+        row = self.conn.execute('SELECT run_id, closed FROM queues WHERE name=?', (queue,)).fetchone()
+        return (row[0], bool(row[1])) if row else None
+
+    def lease(self, queue, limit=1):
+        """领取最多 limit 个待处理或租约已过期的任务，返回 [(key, payload)]"""
+        now = time.time()
+        with self.transaction() as conn:
+            # 最后一次尝试的租约也过期了，说明 worker 在处理时退出，不再重试
+            conn.execute("UPDATE tasks SET status='failed', error='lease expired', updated_at=? "
+                         "WHERE queue=? AND status='leased' AND lease_expires < ? AND attempts >= ?",
+                         (now, queue, now, self.max_attempts))
+            rows = conn.execute(
+                "SELECT key, payload FROM tasks WHERE queue=? AND attempts < ? AND "
+                "(status='pending' OR (status='leased' AND lease_expires < ?)) "
+                "ORDER BY attempts, rowid LIMIT ?", (queue, self.max_attempts, now, limit)).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET status='leased', attempts=attempts + 1, lease_owner=?, lease_expires=?, "
+                "updated_at=? WHERE queue=? AND key=?",
+                [(self.worker_id, now + self.lease_seconds, now, queue, key) for key, _ in rows])
+        return [(key, json.loads(payload)) for key, payload in rows]
+
+    def heartbeat(self, queue, keys):
+        """为仍由本 worker 持有的任务续租"""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE tasks SET lease_expires=?, updated_at=? "
+                "WHERE queue=? AND key=? AND status='leased' AND lease_owner=?",
+                [(now + self.lease_seconds, now, queue, key, self.worker_id) for key in keys])
+
+    def complete(self, queue, key):
+        """标记完成，返回是否成功；租约已过期并被其他 worker 领取时返回 False，不改动任务"""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status='done', lease_owner=NULL, lease_expires=NULL, error=NULL, updated_at=? "
+                "WHERE queue=? AND key=? AND status='leased' AND lease_owner=?",
+                (time.time(), queue, key, self.worker_id))
+        return cursor.rowcount > 0
+
+    def fail(self, queue, key, error):
+        """任务失败：未达到最大尝试次数时放回队列，否则标记为 failed；同 complete，只改动本 worker 持有的任务"""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status=CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+                "lease_owner=NULL, lease_expires=NULL, error=?, updated_at=? "
+                "WHERE queue=? AND key=? AND status='leased' AND lease_owner=?",
+                (self.max_attempts, str(error), time.time(), queue, key, self.worker_id))
+        return cursor.rowcount > 0
+
+    def drained(self, queue, run_id=None):
+        """队列（指定 run_id 时为该轮）已关闭，并且没有可以再领取或正在处理的任务"""
+        state = self.state(queue)
+        if not state or not state[1] or (run_id is not None and state[0] != run_id):
+            return False
+        conn = self.conn
+        remaining = conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE queue=? AND attempts < ? AND status IN ('pending', 'leased')",
+            (queue, self.max_attempts)).fetchone()[0]
+        return remaining == 0
+
+    def counts(self, queue):
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM tasks WHERE queue=? GROUP BY status', (queue,)))
+
+    @contextmanager
+    def keep_alive(self, queue, keys):
+        """处理期间在后台线程中定期续租，避免长任务的租约过期被重复领取"""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lease_seconds / 3):
+                self.heartbeat(queue, keys)
+
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def iter_leases(self, queue, batch_size=1, poll_seconds=POLL_SECONDS, join_seconds=JOIN_SECONDS):
+        """持续领取任务直到所在的一轮排空；队列暂时为空但未关闭时等待 coordinator 入队
+
+        worker 加入启动后看到的第一个未关闭的轮次。启动时队列已关闭，可能是上一轮留下的状态，
+        先等待 coordinator 开始新一轮，超过 join_seconds 仍没有新一轮时按已关闭的这一轮处理。
+        """
+        started = time.monotonic()
+        run_id = None
+        while True:
+            state = self.state(queue)
+            if state and not state[1]:
+                run_id = state[0]
+            elif run_id is None and state and time.monotonic() - started >= join_seconds:
+                run_id = state[0]
+            leased = self.lease(queue, batch_size)
+            if leased:
+                yield leased
+            elif run_id is not None and self.drained(queue, run_id):
+                return
+            else:
+                time.sleep(poll_seconds)
@@ -0,0 +1,139 @@
+"""懂车帝参数页解析基准：对比旧的逐列 XPath 解析与 dcd_parser 的单遍解析
+
+用法：
+    python benchmarks/bench_dcd_parser.py [--repeat 5] [--fixtures benchmarks/fixtures/dcd_params]
+
+fixtures 目录下的每个 *.html 都是保存下来的参数页（例如浏览器“另存为”或 page.content()）。
+目录为空时会先生成一个 30 个车型 × 300 个属性的合成页面。
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+from lxml import html
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'app'))
+
+from dcd_parser import parse_param_table
+
+FIXTURE_DIR = Path(__file__).resolve().parent / 'fixtures' / 'dcd_params'
+
+
+def legacy_parse(content):
+    """dcd.py 原来的解析逻辑，作为对照"""
+    dom = html.fromstring(content)
+
+    car_names = dom.xpath('//a[contains(@class,"cell_car")]/text()')
+    car_name_texts = [name.strip() for name in car_names]
+
+    attribute_names = dom.xpath('//label/text()')
+    attribute_names = [attr.strip() for attr in attribute_names]
+
+    car_data_dict = {name: {attr: '' for attr in attribute_names} for name in car_name_texts}
+
+    prices = dom.xpath('//div[contains(@class,"official-price")]/text()')
+    price_texts = [price.strip() for price in prices]
+
+    for i, car_name in enumerate(car_name_texts):
+        if i < len(price_texts):
+            car_data_dict[car_name]['官方指导价'] = price_texts[i]
+
+    xpath_value = '//div[@data-row-anchor]/parent::*/div[contains(@class,"table_row") and not(contains(@class,"title"))]'
+    value_elements = dom.xpath(xpath_value)
+    for elem in value_elements:
+        nested_elem = elem.xpath('./div[contains(@class,"nest")]')
+        if nested_elem:
+            nested_rows = elem.xpath('.//div[contains(@class,"table_row")]')
+            for row_index, row in enumerate(nested_rows):
+                for col_index in range(len(car_name_texts)):
+                    index_texts = row.xpath(f'.//div[contains(@style,"index:{col_index + 1}")]//text()')
+                    index_texts = [text.strip() for text in index_texts if text.strip()]
+                    if index_texts:
+                        attribute_value = " ".join(index_texts)
+                        car_data_dict[car_name_texts[col_index]][attribute_names[value_elements.index(elem)]] = attribute_value
+        else:
+            cell_normal_elements = elem.xpath('.//div[contains(@class,"cell_normal")]')
+            for i, cell in enumerate(cell_normal_elements):
+                if cell.xpath('.//img'):
+                    text = 'NULL'
+                else:
+                    text = cell.text_content().strip()
+                if text:
+                    car_data_dict[car_name_texts[i]][attribute_names[value_elements.index(elem)]] = text
+
+    return car_data_dict
+
+
+def make_synthetic_page(trims=30, attributes=300, seed=0):
+    """生成与参数页结构一致的合成页面，约十分之一的属性为嵌套行"""
+    rng = random.Random(seed)
+    prices = [f'{rng.randint(8, 60)}.{rng.randint(0, 99)}万' for _ in range(trims)]
+    parts = ['<html><body><div class="table_head">']
+    for t in range(trims):
+        parts.append(f'<div><a class="cell_car">2024款 车型{t}</a><div class="official-price">{prices[t]}</div></div>')
+    parts.append('</div><div class="table_body">')
+    parts.append('<div class="group"><div data-row-anchor="price"></div><div class="table_row"><label>官方指导价</label>')
+    parts.extend(f'<div class="cell_normal">{price}</div>' for price in prices)
+    parts.append('</div></div>')
+    for a in range(1, attributes):
+        parts.append(f'<div class="group"><div data-row-anchor="row{a}"></div><div class="table_row">')
+        parts.append(f'<label>属性{a}</label>')
+        if a % 10 == 0:
+            parts.append('<div class="nest">')
+            for r in range(2):
+                parts.append('<div class="table_row">')
+                for t in range(trims):
+                    parts.append(f'<div style="position:absolute;index:{t + 1}"><span>值{a}-{r}</span> <span>{t}</span></div>')
+                parts.append('</div>')
+            parts.append('</div>')
+        else:
+            for t in range(trims):
+                if rng.random() < 0.2:
+                    parts.append('<div class="cell_normal"><img src="dot.png"></div>')
+                else:
+                    parts.append(f'<div class="cell_normal"><span>{rng.randint(0, 5000)}</span> mm</div>')
+        parts.append('</div></div>')
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def count_differences(legacy_result, car_data_dict):
+    return sum(1 for trim, attrs in car_data_dict.items()
+               for attr, value in attrs.items() if legacy_result.get(trim, {}).get(attr) != value)
+
+
+def best_of(func, content, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(content)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', type=Path, default=FIXTURE_DIR)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    fixtures = sorted(args.fixtures.glob('*.html'))
+    if not fixtures:
+        args.fixtures.mkdir(parents=True, exist_ok=True)
+        synthetic = args.fixtures / 'synthetic_30x300.html'
+        synthetic.write_text(make_synthetic_page(), encoding='utf-8')
+        fixtures = [synthetic]
+
+    print(f"{'fixture':<40}{'legacy (s)':>12}{'single-pass (s)':>18}{'speedup':>10}{'diff cells':>12}")
+    for fixture in fixtures:
+        content = fixture.read_bytes()
+        legacy_time, legacy_result = best_of(legacy_parse, content, args.repeat)
+        new_time, table = best_of(parse_param_table, content, args.repeat)
+        # 旧逻辑用 contains(@style,"index:1") 会把 index:10 等列也拼进来，超过 9 个车型时嵌套行的结果不同
+        diff = count_differences(legacy_result, table.to_car_data_dict())
+        print(f"{fixture.name:<40}{legacy_time:>12.4f}{new_time:>18.4f}{legacy_time / new_time:>9.1f}x{diff:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""离线回放基准：不访问网络，测量解析耗时、解析内存和端到端抽取吞吐
+
+用法：
+    python benchmarks/bench_replay.py [--repeat 5]                       # 只测解析器，不需要浏览器
+    python benchmarks/bench_replay.py --browser [--source html|har] [--concurrency 4] [--rounds 3]
+    python benchmarks/bench_replay.py --browser --json before.json         # 保存结果，便于优化前后对比
+
+fixtures 由 record_fixtures.py 录制；没有录制的参数页和评价页时使用合成页面。
+--browser 通过 BrowserPool + PageWindow 按爬虫相同的路径打开页面（导航、就绪等待、DOM 提取、解析），
+html 模式由本地 HTTP 替身提供 HTML 快照，har 模式按原始地址从 HAR 回放。
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import tracemalloc
+from collections import deque
+
+from replay import FIXTURE_DIR, KINDS, load_manifest, fixture_files, ensure_synthetic, \
+    FixtureServer, local_only, from_har
+from dcd_parser import parse_param_table
+from dcd_api import extract_raw_data, build_param_table
+from autohome_parser import parse_review_page
+from discovery import LIBRARY_DISCOVERY
+from metrics import METRICS
+
+# 解析器：fixture 类型 -> [(名称, 函数)]，函数接收页面 HTML 字节
+PARSERS = {
+    'dcd_params': [
+        ('param_table', parse_param_table),
+        ('next_data', lambda content: build_param_table(extract_raw_data(content))),
+    ],
+    'autohome_review': [
+        ('review', parse_review_page),
+    ],
+}
+
+
+def measure_parser(func, content, repeat):
+    """返回 (最短耗时, 解析过程中 Python 分配内存的峰值字节数, 结果)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(content)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak, result
+
+
+def bench_parsers(repeat):
+    results = []
+    print(f"{'kind':<18}{'parser':<14}{'pages':>7}{'mean (ms)':>12}{'max (ms)':>11}{'peak mem (KB)':>15}{'empty':>7}")
+    for kind, parsers in PARSERS.items():
+        contents = [path.read_bytes() for path in fixture_files(kind)]
+        if not contents:
+            continue
+        for name, func in parsers:
+            samples = [measure_parser(func, content, repeat) for content in contents]
+            timings = [elapsed for elapsed, _, _ in samples]
+            peaks = [peak for _, peak, _ in samples]
+            # 例如合成页面没有内嵌 JSON，next_data 返回 None
+            empty = sum(1 for _, _, result in samples if result is None)
+            result = {'kind': kind, 'parser': name, 'pages': len(contents),
+                      'mean_seconds': sum(timings) / len(timings), 'max_seconds': max(timings),
+                      'peak_bytes': max(peaks), 'empty': empty}
+            results.append(result)
+            print(f"{kind:<18}{name:<14}{len(contents):>7}{result['mean_seconds'] * 1000:>12.2f}"
+                  f"{result['max_seconds'] * 1000:>11.2f}{result['peak_bytes'] / 1024:>15.0f}{empty:>7}")
+    return results
+
+
+def replay_targets(source, server):
+    """按 fixture 类型返回要打开的地址列表"""
+    targets = {}
+    if source == 'har':
+        for entry in load_manifest():
+            targets.setdefault(entry['kind'], []).append(entry['url'])
+    else:
+        for kind in KINDS:
+            urls = [server.url_for(path) for path in fixture_files(kind)]
+            if urls:
+                targets[kind] = urls
+    return targets
+
+
+def extractor(kind):
+    """每类页面就绪后的抽取步骤，与爬虫中的处理一致"""
+    if kind == 'dcd_library':
+        return LIBRARY_DISCOVERY.discover
+    if kind == 'autohome_koubei':
+        return lambda page: page.query_selector_all('//a[contains(text(),"查看完整口碑")]')
+
+    parsers = PARSERS.get(kind, [])
+
+    def extract(page):
+        with METRICS.timer('dom_extract'):
+            content = page.content()
+        if parsers:
+            with METRICS.timer('parse'):
+                return parsers[0][1](content.encode('utf-8'))
+        return content
+    return extract
+
+
+def bench_browser(source, concurrency, rounds, targets, setup_context):
+    from playwright.sync_api import sync_playwright
+    from readiness import wait_ready
+    from browser_pool import BrowserPool, process_tree_rss
+    from page_window import PageWindow
+
+    logger = logging.getLogger('bench_replay')
+    results = []
+    print(f"{'kind':<18}{'pages':>7}{'failed':>8}{'pages/s':>10}{'rss start (MB)':>16}{'rss peak (MB)':>15}")
+    with sync_playwright() as playwright:
+        pool = BrowserPool(playwright, logger, setup_context=setup_context, headless=True)
+        for kind, urls in targets.items():
+            site, ready_kind = KINDS[kind]
+            extract = extractor(kind)
+            queue = deque((f'{round_index}:{index}', url) for round_index in range(rounds)
+                          for index, url in enumerate(urls))
+            total = len(queue)
+            failed = []
+            rss_start = process_tree_rss(os.getpid()) or 0
+            rss_peak = [rss_start]
+
+            def handle(key, page):
+                wait_ready(page, site, ready_kind)
+                extract(page)
+                METRICS.inc('pages_total', kind=kind)
+                rss_peak[0] = max(rss_peak[0], process_tree_rss(os.getpid()) or 0)
+
+            window = PageWindow(pool, concurrency)
+            start = time.perf_counter()
+            window.process(queue, handle, lambda key, e: failed.append((key, repr(e))))
+            elapsed = time.perf_counter() - start
+
+            result = {'kind': kind, 'source': source, 'pages': total, 'failed': len(failed),
+                      'seconds': elapsed, 'pages_per_second': (total - len(failed)) / elapsed,
+                      'rss_start_bytes': rss_start, 'rss_peak_bytes': rss_peak[0]}
+            results.append(result)
+            print(f"{kind:<18}{total:>7}{len(failed):>8}{result['pages_per_second']:>10.1f}"
+                  f"{rss_start / 1024 / 1024:>16.0f}{rss_peak[0] / 1024 / 1024:>15.0f}")
+            for key, error in failed[:3]:
+                print(f'    {key}: {error}')
+        pool.close()
+
+    print('\n各阶段耗时:')
+    for line in METRICS.summary_lines():
+        if line.startswith('stage_seconds'):
+            print(f'    {line}')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='解析器每个页面重复的次数，取最短耗时')
+    parser.add_argument('--browser', action='store_true', help='同时测量浏览器端到端吞吐')
+    parser.add_argument('--source', choices=['html', 'har'], default='html')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=3, help='每个 fixture 打开的次数')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    ensure_synthetic()
+    report = {'parsers': bench_parsers(args.repeat)}
+
+    if args.browser:
+        print()
+        if args.source == 'har':
+            har_paths = sorted((FIXTURE_DIR / 'har').glob('*.har'))
+            if not har_paths:
+                parser.error('没有录制的 HAR，先运行 record_fixtures.py')
+            report['browser'] = bench_browser('har', args.concurrency, args.rounds,
+                                              replay_targets('har', None), from_har(har_paths))
+        else:
+            with FixtureServer() as server:
+                report['browser'] = bench_browser('html', args.concurrency, args.rounds,
+                                                  replay_targets('html', server), local_only(server.base_url))
+        report['stages'] = METRICS.snapshot()['histograms']
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump(report, json_file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""从线上站点录制回放基准使用的 fixtures（需要联网，只在更新 fixtures 时运行）
+
+用法：
+    python benchmarks/record_fixtures.py [--site dcd|autohome|all] [--limit 10]
+        [--autohome-series https://www.autohome.com.cn/xxxx/ ...]
+
+每个站点录制一个 HAR（fixtures/har/<site>.har，响应内容内嵌），同时把每个页面就绪后的 HTML
+保存到 fixtures/<kind>/ 下，并在 fixtures/manifest.json 中记录原始地址。
+懂车帝从车型库录制前 limit 个车型的参数页；汽车之家从给定的车系页进入口碑列表，录制列表页和前 limit 条评价。
+"""
+import re
+import argparse
+from urllib.parse import urljoin
+from playwright.sync_api import sync_playwright
+
+from replay import FIXTURE_DIR, load_manifest, save_manifest
+from readiness import wait_ready
+from discovery import LIBRARY_DISCOVERY
+
+DCD_LIBRARY_URL = 'https://www.dongchedi.com/auto/library/x-x-x-x-x-x-x-x-x-x-x'
+
+
+def fixture_name(text):
+    return re.sub(r'[\\/*?:"<>|\s]', '_', text)[:80]
+
+
+def hrefs(page, xpath, limit):
+    urls = []
+    for element in page.query_selector_all(xpath)[:limit]:
+        href = element.get_attribute('href')
+        if href and not href.startswith('javascript'):
+            urls.append(urljoin(page.url, href))
+    return urls
+
+
+class Recorder:
+    def __init__(self, browser, site, fixture_dir=FIXTURE_DIR):
+        self.fixture_dir = fixture_dir
+        har_dir = fixture_dir / 'har'
+        har_dir.mkdir(parents=True, exist_ok=True)
+        self.context = browser.new_context(record_har_path=str(har_dir / f'{site}.har'),
+                                           record_har_content='embed')
+        self.page = self.context.new_page()
+        self.entries = []
+
+    def save(self, kind, name, url):
+        """保存当前页面的 HTML，返回保存的路径"""
+        directory = self.fixture_dir / kind
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{fixture_name(name)}.html'
+        path.write_text(self.page.content(), encoding='utf-8')
+        self.entries.append({'kind': kind, 'url': url, 'file': path.relative_to(self.fixture_dir).as_posix()})
+        print(f'{kind:<18}{path.name}')
+        return path
+
+    def open(self, url, site, kind):
+        self.page.goto(url)
+        wait_ready(self.page, site, kind)
+
+    def close(self):
+        # 关闭上下文时才写出 HAR
+        self.context.close()
+
+
+def record_dcd(recorder, limit):
+    recorder.open(DCD_LIBRARY_URL, 'dcd', 'library')
+    recorder.save('dcd_library', 'library', DCD_LIBRARY_URL)
+    cars = [(name, url) for name, url in LIBRARY_DISCOVERY.discover(recorder.page) if url][:limit]
+    for car_name, url in cars:
+        recorder.open(url, 'dcd', 'param')
+        recorder.save('dcd_params', car_name, url)
+
+
+def record_autohome(recorder, series_urls, limit):
+    for series_url in series_urls:
+        recorder.open(series_url, 'autohome', 'series')
+        koubei_urls = hrefs(recorder.page, '//li/a[text()="口碑"]', 1)
+        if not koubei_urls:
+            print(f'{series_url} 没有找到口碑链接，跳过')
+            continue
+        recorder.open(koubei_urls[0], 'autohome', 'koubei')
+        koubei_path = recorder.save('autohome_koubei', koubei_urls[0].rstrip('/').rsplit('/', 2)[-2], koubei_urls[0])
+        for review_url in hrefs(recorder.page, '//a[contains(text(),"查看完整口碑")]', limit):
+            recorder.open(review_url, 'autohome', 'review')
+            recorder.save('autohome_review', f'{koubei_path.stem}_{review_url.rstrip("/").rsplit("/", 1)[-1]}',
+                          review_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--site', choices=['dcd', 'autohome', 'all'], default='all')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--autohome-series', nargs='*', default=[])
+    args = parser.parse_args()
+
+    sites = ['dcd', 'autohome'] if args.site == 'all' else [args.site]
+    if 'autohome' in sites and not args.autohome_series:
+        parser.error('录制汽车之家需要用 --autohome-series 指定至少一个车系页地址')
+
+    # 重新录制的站点替换其原有的记录，其他站点保留
+    prefixes = tuple(f'{site}_' for site in sites)
+    entries = [entry for entry in load_manifest() if not entry['kind'].startswith(prefixes)]
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch(headless=True)
+        for site in sites:
+            recorder = Recorder(browser, site)
+            try:
+                if site == 'dcd':
+                    record_dcd(recorder, args.limit)
+                else:
+                    record_autohome(recorder, args.autohome_series, args.limit)
+            finally:
+                recorder.close()
+                entries.extend(recorder.entries)
+        browser.close()
+    save_manifest(entries)
+    print(f'已录制 {len(entries)} 个页面，清单写入 {FIXTURE_DIR / "manifest.json"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""离线回放基准共用的 fixtures 读写、本地 HTTP 替身和路由安装
+
+fixtures 目录结构：
+    fixtures/manifest.json          录制时写入的 [{"kind", "url", "file"}]，file 相对于 fixtures 目录
+    fixtures/<kind>/*.html          各类页面的 HTML 快照，kind 见 KINDS
+    fixtures/har/<site>.har         录制的完整请求，供 route_from_har 回放
+
+回放有两种方式：
+    html  在本地起一个 HTTP 替身，按 /<kind>/<文件名> 提供 HTML 快照，页面发出的其他请求全部中止；
+    har   页面打开录制时的原始地址，由 context.route_from_har 从 HAR 中回放，HAR 中没有的请求中止。
+"""
+import sys
+import json
+import random
+import threading
+from pathlib import Path
+from functools import partial
+from urllib.parse import quote, urlsplit
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'app'))
+
+FIXTURE_DIR = Path(__file__).resolve().parent / 'fixtures'
+MANIFEST_NAME = 'manifest.json'
+
+# fixture 类型 -> (站点, 就绪标志的页面类型)，与 readiness.READY_SELECTORS 对应
+KINDS = {
+    'dcd_library': ('dcd', 'library'),
+    'dcd_params': ('dcd', 'param'),
+    'autohome_koubei': ('autohome', 'koubei'),
+    'autohome_review': ('autohome', 'review'),
+}
+
+
+def load_manifest(fixture_dir=FIXTURE_DIR):
+    manifest_path = Path(fixture_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return []
+    return json.loads(manifest_path.read_text(encoding='utf-8'))
+
+
+def save_manifest(entries, fixture_dir=FIXTURE_DIR):
+    manifest_path = Path(fixture_dir) / MANIFEST_NAME
+    manifest_path.write_text(json.dumps(entries, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def fixture_files(kind, fixture_dir=FIXTURE_DIR):
+    return sorted((Path(fixture_dir) / kind).glob('*.html'))
+
+
+def make_synthetic_review(sections=12, seed=0):
+    """生成与汽车之家评价详情页结构一致的合成页面：车名、用户、若干 (标题+评分, 内容) 段落"""
+    rng = random.Random(seed)
+    titles = ['最满意', '最不满意', '空间', '驾驶感受', '续航', '外观', '内饰', '性价比', '智能化', '舒适性',
+              '油耗', '配置', '动力', '操控', '售后']
+    parts = ['<html><body><div class="title-name"><a href="/spec/1">合成车型 2024款</a></div>',
+             f'<div class="user"><a id="nickname_{seed}">用户{seed}</a></div><div class="kb-con">']
+    for index in range(sections):
+        title = titles[index % len(titles)]
+        score = f'<span>{rng.randint(1, 5)}</span>' if index > 1 else ''
+        text = '，'.join(f'第{index}段第{n}句评价内容' for n in range(rng.randint(5, 40)))
+        parts.append(f'<div class="kb-item"><h1>{title}{score}</h1><p class="kb-item-msg">{text}</p></div>')
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def ensure_synthetic(fixture_dir=FIXTURE_DIR):
+    """没有录制的 fixtures 时为参数页和评价页生成合成页面，文件名以 synthetic_ 开头，不提交到仓库"""
+    from bench_dcd_parser import make_synthetic_page
+
+    generators = {
+        'dcd_params': lambda seed: make_synthetic_page(seed=seed),
+        'autohome_review': lambda seed: make_synthetic_review(seed=seed),
+    }
+    for kind, generate in generators.items():
+        directory = Path(fixture_dir) / kind
+        if fixture_files(kind, fixture_dir):
+            continue
+        directory.mkdir(parents=True, exist_ok=True)
+        for seed in range(8):
+            (directory / f'synthetic_{seed}.html').write_text(generate(seed), encoding='utf-8')
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """本地 HTTP 替身，在后台线程中提供 fixtures 目录下的静态文件"""
+
+    def __init__(self, fixture_dir=FIXTURE_DIR):
+        handler = partial(QuietHandler, directory=str(fixture_dir))
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url_for(self, path, fixture_dir=FIXTURE_DIR):
+        relative = Path(path).resolve().relative_to(Path(fixture_dir).resolve())
+        return f'{self.base_url}/{quote(relative.as_posix())}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def local_only(base_url):
+    """上下文路由：只放行本地替身的请求，页面引用的外部脚本、图片等全部中止，保证回放不访问网络"""
+    host = urlsplit(base_url).netloc
+
+    def install(context):
+        context.route('**/*', lambda route: route.continue_() if urlsplit(route.request.url).netloc == host
+                      else route.abort())
+    return install
+
+
+def from_har(har_paths):
+    """上下文路由：从录制的 HAR 中回放，HAR 中没有的请求中止"""
+    def install(context):
+        # 后注册的路由先匹配：各 HAR 找不到时交给下一个，最后落到最早注册的中止路由
+        context.route('**/*', lambda route: route.abort())
+        for har_path in har_paths:
+            context.route_from_har(str(har_path), not_found='fallback')
+    return install
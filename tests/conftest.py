@@ -0,0 +1,35 @@
+import sys
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+# 爬虫模块位于 app/ 下，以脚本方式运行，测试时同样从 app/ 导入；解析器对照用的旧实现在 benchmarks/ 下
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'app'))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from sqlite_autohome import create_table, import_file, ensure_review_index  # noqa: E402
+from import_manifest import ensure_manifest  # noqa: E402
+
+# 评价库测试共用的表结构
+REVIEW_COLUMNS = ['评价ID', '车名', '用户ID', '空间', 'source_file']
+
+
+@pytest.fixture
+def review_db(tmp_path):
+    """tmp_path/reviews.db 中建好导入清单、评价表和评价ID索引，返回连接"""
+    conn = sqlite3.connect(str(tmp_path / 'reviews.db'))
+    ensure_manifest(conn)
+    with conn:
+        create_table(conn.cursor(), REVIEW_COLUMNS)
+        ensure_review_index(conn.cursor())
+    yield conn
+    conn.close()
+
+
+def import_reviews(conn, rows, columns=REVIEW_COLUMNS, csv_file='a_评价.csv'):
+    """按 sqlite_autohome 的方式导入一个评价文件，rows 不含来源文件列，内容不同的 rows 视为文件有变化"""
+    info = {'size': 0, 'mtime': 0, 'content_hash': str(rows)}
+    chunks = [[list(row) + [csv_file] for row in rows]]
+    return import_file(conn, csv_file, (columns, chunks), info, set(REVIEW_COLUMNS))
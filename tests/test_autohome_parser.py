@@ -0,0 +1,33 @@
+import re
+from pathlib import Path
+
+from lxml import html
+
+from autohome_parser import parse_review_page
+
+FIXTURE = Path(__file__).resolve().parent / 'fixtures' / 'autohome_review.html'
+
+
+def legacy_parse(content):
+    """autohome.py 原来在页面上逐项查询的解析逻辑，作为对照"""
+    dom = html.fromstring(content)
+    review_data = {'车名': dom.xpath('//div[contains(@class,"title-name")]//a')[0].text_content().strip(),
+                   '用户ID': dom.xpath('//a[contains(@id,"nickname")]')[0].text_content().strip()}
+    review_items = dom.xpath('//p[@class="kb-item-msg"]')
+    review_titles = dom.xpath('//p[@class="kb-item-msg"]/preceding-sibling::h1')
+    review_scores = dom.xpath('//p[@class="kb-item-msg"]/preceding-sibling::h1/span')
+    for title, item, score in zip(review_titles, review_items, review_scores):
+        cleaned_title = ''.join(re.findall(r'[\u4e00-\u9fa5]', title.text_content().strip()))
+        review_data[cleaned_title] = item.text_content().strip()
+        review_data[f'{cleaned_title}评分'] = score.text_content().strip()
+    return review_data
+
+
+def test_keys_match_legacy_parser():
+    content = FIXTURE.read_bytes()
+    review_data = parse_review_page(content)
+
+    assert review_data == legacy_parse(content)
+    # 评分 span 中的中文也计入标题，列名与之前导出的CSV一致
+    assert list(review_data) == ['车名', '用户ID', '最满意分', '最满意分评分', '空间', '空间评分',
+                                 '驾驶感受分', '驾驶感受分评分', '性价比星', '性价比星评分']
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+import pytest
+
+from dcd_parser import parse_param_table
+from bench_dcd_parser import legacy_parse, make_synthetic_page
+
+FIXTURE = Path(__file__).resolve().parent / 'fixtures' / 'dcd_param_nested.html'
+
+
+def test_nested_rows_and_z_index_cells():
+    car_data = parse_param_table(FIXTURE.read_bytes()).to_car_data_dict()
+
+    assert car_data['2024款 标准版']['外观颜色'] == '白色 黑色'
+    assert car_data['2024款 豪华版']['外观颜色'] == '蓝色'
+    assert car_data['2024款 旗舰版']['外观颜色'] == '红色'
+    assert car_data['2024款 旗舰版']['长度(mm)'] == 'NULL'
+    assert car_data['2024款 豪华版']['座椅材质'] == '皮质'
+
+
+@pytest.mark.parametrize('content', [FIXTURE.read_bytes(), make_synthetic_page(trims=6, attributes=40)],
+                         ids=['nested_fixture', 'synthetic'])
+def test_parity_with_legacy_parser(content):
+    assert parse_param_table(content).to_car_data_dict() == legacy_parse(content)
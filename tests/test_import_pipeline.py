@@ -0,0 +1,33 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import import_pipeline
+from import_pipeline import parallel_parse
+
+
+def identity(task):
+    return task
+
+
+def test_in_flight_bytes_are_bounded(monkeypatch):
+    log = []
+
+    class RecordingExecutor(ProcessPoolExecutor):
+        def submit(self, fn, task):
+            log.append(('submit', task))
+            return super().submit(fn, task)
+
+    monkeypatch.setattr(import_pipeline, 'ProcessPoolExecutor', RecordingExecutor)
+    sizes = {'a': 60, 'b': 60, 'c': 30, 'd': 200}
+    for task, result, error in parallel_parse(list(sizes), identity, workers=2, task_bytes=sizes.get, max_bytes=100):
+        assert error is None and result == task
+        log.append(('done', task))
+
+    in_flight = set()
+    for event, task in log:
+        if event == 'submit':
+            in_flight.add(task)
+            # 单个超过上限的任务仍会单独提交
+            assert len(in_flight) == 1 or sum(sizes[t] for t in in_flight) <= 100
+        else:
+            in_flight.remove(task)
+    assert sorted(task for event, task in log if event == 'done') == ['a', 'b', 'c', 'd']
@@ -0,0 +1,56 @@
+import pytest
+
+from review_stream import iter_reviews
+from conftest import REVIEW_COLUMNS as COLUMNS, import_reviews
+
+LEGACY_COLUMNS = ['车名', '用户ID', '空间', 'source_file']
+
+
+@pytest.fixture
+def db_path(review_db, tmp_path):
+    return tmp_path / 'reviews.db'
+
+
+def export(db_path, cursor=0):
+    texts = []
+    for records, cursor in iter_reviews(db_path, chunk_size=2, cursor=cursor):
+        texts.extend(record['text'] for record in records)
+    return texts, cursor
+
+
+def test_resume_after_reimport_does_not_repeat_rows(review_db, db_path):
+    import_reviews(review_db, [('1', '车', 'u1', 'a1'), ('2', '车', 'u2', 'a2')], COLUMNS, 'a_评价.csv')
+    import_reviews(review_db, [('车', 'u3', 'b1'), ('车', 'u4', 'b2')], LEGACY_COLUMNS, 'old_评价.csv')
+    texts, cursor = export(db_path)
+    assert sorted(texts) == ['a1', 'a2', 'b1', 'b2']
+
+    # 两个文件都在末尾追加了新评价，a 中已有的一条内容有更新
+    import_reviews(review_db, [('1', '车', 'u1', 'a1'), ('2', '车', 'u2', 'a2+'), ('5', '车', 'u5', 'a5')],
+                   COLUMNS, 'a_评价.csv')
+    import_reviews(review_db, [('车', 'u3', 'b1'), ('车', 'u4', 'b2'), ('车', 'u6', 'b3')],
+                   LEGACY_COLUMNS, 'old_评价.csv')
+    texts, _ = export(db_path, cursor)
+    assert sorted(texts) == ['a5', 'b3']
+
+
+def test_legacy_file_rewritten_in_the_middle(review_db, db_path):
+    import_reviews(review_db, [('车', 'u1', 'b1'), ('车', 'u2', 'b2'), ('车', 'u3', 'b3')],
+                   LEGACY_COLUMNS, 'old_评价.csv')
+    texts, cursor = export(db_path)
+    import_reviews(review_db, [('车', 'u1', 'b1'), ('车', 'u2', 'c2')], LEGACY_COLUMNS, 'old_评价.csv')
+
+    assert [row[0] for row in review_db.execute('SELECT "空间" FROM reviews ORDER BY id')] == ['b1', 'c2']
+    assert export(db_path, cursor)[0] == ['c2']
+
+
+def test_resume_after_reimport_of_upgraded_legacy_file(review_db, db_path):
+    # 旧版文件先导入，之后 BufferedCsvWriter 补上评价ID列，旧行的评价ID为空
+    import_reviews(review_db, [('车', 'u1', 'x'), ('车', 'u2', 'y')], LEGACY_COLUMNS, 'old_评价.csv')
+    import_reviews(review_db, [(None, '车', 'u1', 'x'), (None, '车', 'u2', 'y'), ('1', '车', 'u3', 'z')],
+                   COLUMNS, 'old_评价.csv')
+    texts, cursor = export(db_path)
+    assert sorted(texts) == ['x', 'y', 'z']
+
+    import_reviews(review_db, [(None, '车', 'u1', 'x'), (None, '车', 'u2', 'y'), ('1', '车', 'u3', 'z'),
+                               ('2', '车', 'u4', 'w')], COLUMNS, 'old_评价.csv')
+    assert export(db_path, cursor)[0] == ['w']
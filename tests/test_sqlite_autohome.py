@@ -0,0 +1,42 @@
+import sqlite3
+
+import sqlite_autohome
+from sqlite_autohome import create_table, ensure_review_index
+from conftest import REVIEW_COLUMNS, import_reviews
+
+
+def rows_by_review(conn):
+    return {row[1]: row for row in conn.execute('SELECT id, "评价ID", "空间" FROM reviews')}
+
+
+def test_reimport_keeps_ids_and_updates_rows(review_db):
+    import_reviews(review_db, [('1', '车', 'u1', '大'), ('2', '车', 'u2', '小'), ('3', '车', 'u3', '中')])
+    before = rows_by_review(review_db)
+
+    import_reviews(review_db, [('1', '车', 'u1', '大'), ('3', '车', 'u3', '很大'), ('4', '车', 'u4', '小')])
+    after = rows_by_review(review_db)
+
+    assert set(after) == {'1', '3', '4'}
+    assert after['1'][0] == before['1'][0]
+    assert after['3'] == (before['3'][0], '3', '很大')
+    assert after['4'][0] > max(row[0] for row in before.values())
+
+
+def test_other_files_are_untouched(review_db):
+    import_reviews(review_db, [('1', '车', 'u1', '大')], csv_file='a_评价.csv')
+    import_reviews(review_db, [('2', '车', 'u2', '小')], csv_file='b_评价.csv')
+    import_reviews(review_db, [], csv_file='a_评价.csv')
+
+    assert set(rows_by_review(review_db)) == {'2'}
+
+
+def test_duplicate_review_ids_are_merged_before_indexing(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'old.db'))
+    with conn:
+        create_table(conn.cursor(), REVIEW_COLUMNS)
+        conn.executemany(f'INSERT INTO {sqlite_autohome.table_name} ("评价ID", "空间") VALUES (?, ?)',
+                         [('1', '旧'), ('1', '新'), (None, 'x'), (None, 'y')])
+        ensure_review_index(conn.cursor())
+    assert conn.execute('SELECT "评价ID", "空间" FROM reviews ORDER BY id').fetchall() == \
+        [('1', '新'), (None, 'x'), (None, 'y')]
+    conn.close()
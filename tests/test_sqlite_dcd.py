@@ -0,0 +1,31 @@
+import sqlite3
+
+from import_manifest import ensure_manifest, check_file
+from sqlite_dcd import create_schema, drop_legacy_tables, write_empty
+
+
+def test_only_tables_of_param_csvs_are_dropped(tmp_path):
+    (tmp_path / 'Model Y_参数.csv').write_text('', encoding='utf-8')
+    conn = sqlite3.connect(':memory:')
+    for table in ['Model_Y_canshu', 'notes', 'Model_3_canshu']:
+        conn.execute(f'CREATE TABLE "{table}" (x)')
+    assert drop_legacy_tables(conn.cursor(), tmp_path) == 1
+    assert {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")} == \
+        {'notes', 'Model_3_canshu'}
+
+
+def test_empty_csv_is_recorded_in_manifest(tmp_path):
+    csv_file_path = tmp_path / '小鹏P7_参数.csv'
+    csv_file_path.write_text('', encoding='utf-8')
+    conn = sqlite3.connect(':memory:')
+    conn.execute('PRAGMA foreign_keys=ON')
+    ensure_manifest(conn)
+    create_schema(conn.cursor())
+    conn.execute("INSERT INTO series (name) VALUES ('小鹏P7')")
+
+    status, info = check_file(conn, csv_file_path.name, csv_file_path)
+    write_empty(conn, csv_file_path, info)
+
+    assert check_file(conn, csv_file_path.name, csv_file_path)[0] == 'unchanged'
+    assert conn.execute('SELECT rows_loaded FROM import_manifest').fetchone() == (0,)
+    assert conn.execute('SELECT COUNT(*) FROM series').fetchone() == (0,)
@@ -0,0 +1,142 @@
+import time
+
+import pytest
+
+from work_queue import WorkQueue
+
+QUEUE = 'cars'
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / 'work_queue.db'
+
+
+def make_worker(db_path, worker_id, **kwargs):
+    return WorkQueue(db_path, worker_id=worker_id, **kwargs)
+
+
+def expire_leases(queue):
+    queue.conn.execute("UPDATE tasks SET lease_expires=? WHERE status='leased'", (time.time() - 1,))
+
+
+def status_of(queue, key):
+    return queue.conn.execute('SELECT status, attempts, lease_owner FROM tasks WHERE key=?', (key,)).fetchone()
+
+
+def test_lease_is_exclusive(db_path):
+    a = make_worker(db_path, 'a')
+    b = make_worker(db_path, 'b')
+    a.enqueue(QUEUE, {'x': {'url': 'u'}})
+
+    assert a.lease(QUEUE) == [('x', {'url': 'u'})]
+    assert b.lease(QUEUE) == []
+    assert status_of(a, 'x') == ('leased', 1, 'a')
+
+
+def test_expired_lease_is_reassigned(db_path):
+    a = make_worker(db_path, 'a')
+    b = make_worker(db_path, 'b')
+    a.enqueue(QUEUE, {'x': {}})
+    a.lease(QUEUE)
+    expire_leases(a)
+
+    assert b.lease(QUEUE) == [('x', {})]
+    assert status_of(b, 'x') == ('leased', 2, 'b')
+
+
+def test_heartbeat_keeps_lease(db_path):
+    a = make_worker(db_path, 'a', lease_seconds=60)
+    b = make_worker(db_path, 'b')
+    a.enqueue(QUEUE, {'x': {}})
+    a.lease(QUEUE)
+    a.conn.execute("UPDATE tasks SET lease_expires=?", (time.time() + 0.5,))
+    a.heartbeat(QUEUE, ['x'])
+    time.sleep(0.6)
+
+    assert b.lease(QUEUE) == []
+
+
+def test_stale_worker_cannot_complete_or_fail(db_path):
+    a = make_worker(db_path, 'a')
+    b = make_worker(db_path, 'b')
+    a.enqueue(QUEUE, {'x': {}})
+    a.lease(QUEUE)
+    expire_leases(a)
+    b.lease(QUEUE)
+
+    assert not a.fail(QUEUE, 'x', 'timeout')
+    assert not a.complete(QUEUE, 'x')
+    assert status_of(b, 'x') == ('leased', 2, 'b')
+    assert b.complete(QUEUE, 'x')
+    assert status_of(b, 'x') == ('done', 2, None)
+
+
+def test_fail_requeues_until_max_attempts(db_path):
+    a = make_worker(db_path, 'a', max_attempts=2)
+    a.enqueue(QUEUE, {'x': {}})
+    a.lease(QUEUE)
+    assert a.fail(QUEUE, 'x', 'error')
+    assert status_of(a, 'x')[0] == 'pending'
+    a.lease(QUEUE)
+    assert a.fail(QUEUE, 'x', 'error')
+    assert status_of(a, 'x')[0] == 'failed'
+    assert a.lease(QUEUE) == []
+
+
+def test_last_attempt_expiry_marks_failed(db_path):
+    a = make_worker(db_path, 'a', max_attempts=1)
+    a.enqueue(QUEUE, {'x': {}})
+    a.lease(QUEUE)
+    expire_leases(a)
+
+    assert a.lease(QUEUE) == []
+    assert status_of(a, 'x')[0] == 'failed'
+
+
+def test_enqueue_resets_failed_but_not_done(db_path):
+    a = make_worker(db_path, 'a', max_attempts=1)
+    a.enqueue(QUEUE, {'failed': {}, 'done': {}})
+    a.lease(QUEUE, limit=2)
+    a.fail(QUEUE, 'failed', 'error')
+    a.complete(QUEUE, 'done')
+
+    assert a.enqueue(QUEUE, {'failed': {}, 'done': {}}) == 1
+    assert status_of(a, 'failed') == ('pending', 0, None)
+    assert status_of(a, 'done')[0] == 'done'
+    assert a.enqueue(QUEUE, {'done': {}}, reset=True) == 1
+    assert status_of(a, 'done')[0] == 'pending'
+
+
+def test_enqueue_keeps_live_lease(db_path):
+    a = make_worker(db_path, 'a')
+    a.enqueue(QUEUE, {'x': {}})
+    a.lease(QUEUE)
+
+    assert a.enqueue(QUEUE, {'x': {}}, reset=True) == 0
+    assert status_of(a, 'x') == ('leased', 1, 'a')
+
+
+def test_worker_waits_for_new_run_after_stale_close(db_path):
+    coordinator = make_worker(db_path, 'coordinator')
+    worker = make_worker(db_path, 'worker')
+    coordinator.open(QUEUE)
+    coordinator.close(QUEUE)
+
+    leases = worker.iter_leases(QUEUE, poll_seconds=0.01, join_seconds=60)
+    coordinator.open(QUEUE)
+    coordinator.enqueue(QUEUE, {'x': {}})
+    assert next(leases) == [('x', {})]
+    worker.complete(QUEUE, 'x')
+    coordinator.close(QUEUE)
+    assert list(leases) == []
+    assert coordinator.state(QUEUE) == (2, True)
+
+
+def test_worker_exits_after_join_timeout(db_path):
+    coordinator = make_worker(db_path, 'coordinator')
+    worker = make_worker(db_path, 'worker')
+    coordinator.open(QUEUE)
+    coordinator.close(QUEUE)
+
+    assert list(worker.iter_leases(QUEUE, poll_seconds=0.01, join_seconds=0.05)) == []